@@ -9,8 +9,30 @@ import time
 import logging
 import requests
 from requests.exceptions import RequestException
+from src.rate_limit import RateLimiter
+from src.http_session import create_session
 from . import auth
 
+# Лимит API AmoCRM: не более 7 запросов в секунду на интеграцию
+AMO_REQUESTS_PER_SECOND = 7
+
+# Общий для всех потоков ограничитель частоты запросов к API
+_rate_limiter = RateLimiter(AMO_REQUESTS_PER_SECOND)
+
+# Общая сессия с пулом соединений: параллельные загрузки переиспользуют
+# TCP- и TLS-соединения с API вместо нового соединения на каждый запрос
+_session = create_session(pool_connections=32, pool_maxsize=32)
+
+def set_requests_per_second(requests_per_second):
+    """
+    Меняет ограничение частоты запросов к API.
+    
+    Args:
+        requests_per_second (float): Максимум запросов в секунду
+    """
+    global _rate_limiter
+    _rate_limiter = RateLimiter(requests_per_second)
+
 # Настраиваем логирование
 logging.basicConfig(
     level=logging.INFO,
@@ -122,14 +144,17 @@ def make_request(method, url, params=None, data=None, timeout=30):
         logger.debug(f"Данные: {log_data}")
     
     try:
+        # Ждем своей очереди, чтобы параллельные запросы не превышали лимит API
+        _rate_limiter.acquire()
+        
         if method == 'GET':
-            response = requests.get(url, headers=headers, params=params, timeout=timeout, verify=True)
+            response = _session.get(url, headers=headers, params=params, timeout=timeout, verify=True)
         elif method == 'POST':
-            response = requests.post(url, headers=headers, params=params, json=data, timeout=timeout, verify=True)
+            response = _session.post(url, headers=headers, params=params, json=data, timeout=timeout, verify=True)
         elif method == 'PATCH':
-            response = requests.patch(url, headers=headers, params=params, json=data, timeout=timeout, verify=True)
+            response = _session.patch(url, headers=headers, params=params, json=data, timeout=timeout, verify=True)
         elif method == 'DELETE':
-            response = requests.delete(url, headers=headers, params=params, timeout=timeout, verify=True)
+            response = _session.delete(url, headers=headers, params=params, timeout=timeout, verify=True)
         else:
             logger.error(f"Неизвестный метод запроса: {method}")
             return None
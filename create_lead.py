@@ -27,6 +27,9 @@ RESPONSIBLE_USER_ID = 9480922  # ID ответственного "Михаил 
 TAG_NAME = "LeadRecord"
 SOURCE_NAME = "LeadRecord"
 
+# Максимальное количество лидов в одном запросе к leads/complex
+BULK_BATCH_SIZE = 50
+
 def create_contact_with_phone(phone, name=None):
     """
     Создание контакта с номером телефона
@@ -153,6 +156,70 @@ def create_lead_with_phone(phone):
         
     return lead_id, contact_id
 
+def create_leads_bulk(phones):
+    """
+    Создание лидов с контактами для нескольких телефонов одним запросом
+    
+    Лиды и их контакты создаются через комплексный метод leads/complex,
+    не более BULK_BATCH_SIZE телефонов за запрос.
+    
+    Args:
+        phones (list): Номера телефонов
+        
+    Returns:
+        list: Пары (lead_id, contact_id) в порядке phones,
+              (None, None) для телефонов, лиды которых не созданы
+    """
+    results = []
+    for start in range(0, len(phones), BULK_BATCH_SIZE):
+        batch = phones[start:start + BULK_BATCH_SIZE]
+        
+        # request_id связывает элемент ответа с телефоном из пакета
+        leads_data = [
+            {
+                "name": f"LR_{phone}",
+                "pipeline_id": PIPELINE_ID,
+                "status_id": STATUS_ID,
+                "responsible_user_id": RESPONSIBLE_USER_ID,
+                "request_id": str(index),
+                "_embedded": {
+                    "tags": [{"name": TAG_NAME}],
+                    "contacts": [
+                        {
+                            "name": f"Контакт {phone}",
+                            "custom_fields_values": [
+                                {
+                                    "field_id": PHONE_FIELD_ID,
+                                    "values": [
+                                        {
+                                            "value": phone,
+                                            "enum_code": "WORK"  # Рабочий телефон
+                                        }
+                                    ]
+                                }
+                            ]
+                        }
+                    ]
+                }
+            }
+            for index, phone in enumerate(batch)
+        ]
+        
+        logger.debug(f"Создание пакета из {len(batch)} лидов")
+        result = api.post('leads/complex', leads_data)
+        
+        created = {}
+        if isinstance(result, list):
+            for item in result:
+                for request_id in item.get('request_id') or []:
+                    created[request_id] = (item.get('id'), item.get('contact_id'))
+        else:
+            logger.error(f"Ошибка при создании пакета из {len(batch)} лидов")
+        
+        results.extend(created.get(str(index), (None, None)) for index in range(len(batch)))
+    
+    return results
+
 if __name__ == "__main__":
     # Пример использования
     phone_number = input("Введите номер телефона: ")
@@ -3,10 +3,19 @@
 
 Отвечает за формирование и отправку запросов в Битрикс24 через REST API.
 """
-import requests
 from datetime import datetime
 from src.setup import logger
-from src.db import get_connection
+from src import delivery_status_writer as status_writer
+from src.rate_limit import rate_limited
+from src.http_session import create_session
+
+# Лимит REST API Битрикс24: не более 2 запросов в секунду. Ограничитель
+# действует в пределах одного процесса, поэтому веб-сервер по умолчанию
+# запускается одним процессом gunicorn
+BITRIX24_CALLS_PER_SECOND = 2
+
+# Сессия с пулом соединений, общая для всех запросов к Битрикс24
+_session = create_session()
 
 def create_contact(phone, webhook_base_url):
     """
@@ -53,6 +62,7 @@ def create_contact(phone, webhook_base_url):
         return None
     """    
 
+@rate_limited(BITRIX24_CALLS_PER_SECOND)
 def send_to_bitrix24(lead_data, config=None):
     """
     Отправляет данные лида в Битрикс24 через REST API.
@@ -94,7 +104,7 @@ def send_to_bitrix24(lead_data, config=None):
         logger.info(f"Данные лида: {lead_payload}")
         
         # Отправляем запрос в Битрикс24
-        response = requests.post(
+        response = _session.post(
             config['webhook_url'],
             json=lead_payload,
             headers={'Content-Type': 'application/json'},
@@ -116,21 +126,8 @@ def send_to_bitrix24(lead_data, config=None):
             # Проверяем, есть ли ID у лида перед обновлением БД
             lead_db_id = lead_data.get('id')
             if lead_db_id:
-                try:
-                    # Обновляем статус доставки в БД
-                    conn = get_connection()
-                    if conn:
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                        UPDATE leads
-                        SET crm_delivery_status = ?, crm_delivery_time = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                        ''', (f'delivered: Lead {lead_id}', lead_db_id))
-                        conn.commit()
-                        conn.close()
-                except Exception as e:
-                    # Логируем ошибку БД как DEBUG
-                    logger.debug(f"Не удалось обновить статус в БД: {e}")
+                # Обновляем статус доставки в БД
+                status_writer.enqueue(lead_db_id, f'delivered: Lead {lead_id}', True)
             
             return True
         else:
@@ -140,21 +137,8 @@ def send_to_bitrix24(lead_data, config=None):
             # Проверяем, есть ли ID у лида перед обновлением БД
             lead_db_id = lead_data.get('id')
             if lead_db_id:
-                try:
-                    # Обновляем статус доставки
-                    conn = get_connection()
-                    if conn:
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                        UPDATE leads
-                        SET crm_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-                        WHERE id = ?
-                        ''', (f'error: HTTP {response.status_code} - {response.text[:100]}', lead_db_id))
-                        conn.commit()
-                        conn.close()
-                except Exception as e:
-                    # Логируем ошибку БД как DEBUG
-                    logger.debug(f"Не удалось обновить статус в БД: {e}")
+                # Обновляем статус доставки
+                status_writer.enqueue(lead_db_id, f'error: HTTP {response.status_code} - {response.text[:100]}', False)
             
             return False
                 
@@ -165,20 +149,7 @@ def send_to_bitrix24(lead_data, config=None):
         # Проверяем, есть ли ID у лида перед обновлением БД
         lead_db_id = lead_data.get('id')
         if lead_db_id:
-            try:
-                # Обновляем статус доставки
-                conn = get_connection()
-                if conn:
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                    UPDATE leads
-                    SET crm_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-                    WHERE id = ?
-                    ''', (f'error: {str(e)[:100]}', lead_db_id))
-                    conn.commit()
-                    conn.close()
-            except Exception as db_e:
-                # Логируем ошибку БД как DEBUG
-                logger.debug(f"Не удалось обновить статус в БД: {db_e}")
+            # Обновляем статус доставки
+            status_writer.enqueue(lead_db_id, f'error: {str(e)[:100]}', False)
         
         return False 
\ No newline at end of file
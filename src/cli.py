@@ -13,7 +13,7 @@ from pathlib import Path
 
 from src.setup import logger, SOURCE_SPREADSHEET_ID as SHEET_ID, SOURCE_SHEET_NAME as SHEET_NAME
 from src.db import init_db, get_connection
-from src.client_config import add_client, load_clients, add_client_to_config, get_all_clients, get_client_by_name, get_client_by_tag
+from src.client_config import add_client, load_clients, add_client_to_config, get_all_clients, iter_all_clients, get_client_by_name, get_client_by_tag
 from src.client_sheets import check_client_sheet_access, send_to_client_sheet
 from src.webhook import test_webhook, send_to_webhook
 from src.main import process_new_leads
@@ -196,24 +196,25 @@ def handle_process_data(args):
 
 def handle_list_clients(args):
     """Выводит список всех клиентов."""
-    clients = get_all_clients()
-    
     if args.json:
-        print(json.dumps(clients, indent=2, ensure_ascii=False))
-        return
-    
-    if not clients:
-        print("Клиенты не найдены.")
+        print(json.dumps(get_all_clients(), indent=2, ensure_ascii=False))
         return
     
-    print("Список клиентов:")
-    for client in clients:
+    count = 0
+    for client in iter_all_clients():
+        if count == 0:
+            print("Список клиентов:")
+        count += 1
+        
         print(f"- {client['name']} (тег: {client['tag']})")
         if client.get('use_sheet'):
             print(f"  Таблица: {client.get('sheet_id')} / {client.get('sheet_name')}")
         if client.get('use_crm'):
             print(f"  Вебхук CRM: {client.get('webhook_url')}")
         print()
+    
+    if count == 0:
+        print("Клиенты не найдены.")
 
 def handle_run_daemon(args):
     """Запускает процесс периодической проверки новых данных."""
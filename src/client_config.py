@@ -3,13 +3,114 @@
 
 Отвечает за загрузку настроек клиентов из БД и их кэширование.
 """
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from src.setup import logger
-from src.db import get_connection, get_client_by_tag
+from src.db import db_cursor, get_client_by_tag, get_clients_version
 
-# Кэш клиентов для ускорения поиска
-_clients_cache = {}
-_tags_mapping = {}
+# Максимальное количество клиентов в кэше и время жизни записи (секунды)
+CLIENTS_CACHE_MAXSIZE = 1024
+CLIENTS_CACHE_TTL = 60
+
+# Максимальное количество запомненных неизвестных тегов
+NEGATIVE_CACHE_MAXSIZE = 4096
+
+# Как часто (секунды) сверять версию таблицы клиентов в БД
+CLIENTS_VERSION_CHECK_INTERVAL = 5
+
+# Количество клиентов, читаемых из БД за один запрос в iter_all_clients
+CLIENTS_FETCH_SIZE = 500
+
+class _TTLCache:
+    """
+    Ограниченный по размеру LRU-кэш с временем жизни записей.
+    
+    Записи старше ttl секунд удаляются при чтении, при переполнении
+    вытесняются записи, к которым дольше всего не обращались.
+    """
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[1] if item else None
+    
+    def pop_prefix(self, prefix):
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(prefix)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# Кэш клиентов по тегу для ускорения поиска
+_clients_cache = _TTLCache(CLIENTS_CACHE_MAXSIZE, CLIENTS_CACHE_TTL)
+
+# Кэш тегов, для которых клиент не найден, чтобы повторные промахи
+# не приводили к запросам в БД
+_negative_tags = _TTLCache(NEGATIVE_CACHE_MAXSIZE, CLIENTS_CACHE_TTL)
+
+# Версия таблицы клиентов, для которой заполнен кэш, и время последней сверки
+_clients_version = None
+_version_checked_at = 0.0
+
+def _check_clients_version():
+    """
+    Сбрасывает кэш клиентов, если таблица клиентов изменилась.
+    
+    Версия читается из БД не чаще раза в CLIENTS_VERSION_CHECK_INTERVAL
+    секунд, поэтому изменения из других процессов (например, update_tag.py)
+    применяются, не дожидаясь истечения времени жизни записей.
+    """
+    global _clients_version, _version_checked_at
+    
+    now = time.monotonic()
+    if now - _version_checked_at < CLIENTS_VERSION_CHECK_INTERVAL:
+        return
+    _version_checked_at = now
+    
+    version = get_clients_version()
+    if version is None or version == _clients_version:
+        return
+    
+    if _clients_version is not None:
+        logger.info("Таблица клиентов изменилась, кэш клиентов сброшен.")
+        invalidate_all()
+    _clients_version = version
 
 def load_clients():
     """
@@ -18,38 +119,24 @@ def load_clients():
     Returns:
         bool: True, если загрузка прошла успешно, иначе False.
     """
-    global _clients_cache, _tags_mapping
     try:
-        conn = get_connection()
-        if not conn:
-            return False
-        
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM clients')
-        clients = cursor.fetchall()
-        
-        # Очищаем кэш
-        _clients_cache = {}
-        _tags_mapping = {}
-        
-        # Заполняем кэш
-        for client in clients:
-            client_dict = dict(client)
-            client_id = client_dict['id']
-            tag = client_dict['tag']
+        with db_cursor() as (conn, cursor):
+            cursor.execute('SELECT * FROM clients')
             
-            _clients_cache[client_id] = client_dict
-            _tags_mapping[tag] = client_id
-        
-        conn.close()
+            # Очищаем кэш
+            _clients_cache.clear()
+            
+            # Заполняем кэш прямо из курсора, без промежуточного списка строк.
+            # Строки копируются в dict, так как вызывающий код читает
+            # необязательные поля клиента через client.get(...)
+            for client in cursor:
+                _clients_cache.set(client['tag'], dict(client))
         
         logger.info(f"Загружено {len(_clients_cache)} клиентов.")
         return True
     
     except Exception as e:
         logger.error(f"Ошибка при загрузке клиентов: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
         return False
 
 def get_client_by_tag_cached(tag):
@@ -62,26 +149,63 @@ def get_client_by_tag_cached(tag):
     Returns:
         dict: Данные о клиенте или None, если клиент не найден
     """
+    _check_clients_version()
+    
     # Если кэш пуст, загружаем клиентов
     if not _clients_cache:
         load_clients()
     
     # Пытаемся найти клиента в кэше
-    client_id = _tags_mapping.get(tag)
-    if client_id:
-        return _clients_cache.get(client_id)
+    client = _clients_cache.get(tag)
+    if client:
+        return client
     
-    # Если клиент не найден в кэше, ищем в БД
+    # Тег недавно уже искали в БД и не нашли
+    if _negative_tags.get(tag):
+        return None
+    
+    # Если клиент не найден в кэше или запись устарела, ищем в БД
     client = get_client_by_tag(tag)
     if client:
         # Обновляем кэш
-        client_id = client['id']
-        _clients_cache[client_id] = client
-        _tags_mapping[tag] = client_id
+        _clients_cache.set(tag, client)
         return client
     
+    _negative_tags.set(tag, True)
     return None
 
+def invalidate_client(tag):
+    """
+    Удаляет клиента с указанным тегом из кэша.
+    
+    Args:
+        tag (str): Тег клиента
+    """
+    _clients_cache.pop(tag)
+    _negative_tags.pop(tag)
+
+def invalidate_prefix(prefix):
+    """
+    Удаляет из кэша всех клиентов, теги которых начинаются с префикса.
+    
+    Например, invalidate_prefix("[ДМД13]") сбрасывает все теги проекта.
+    
+    Args:
+        prefix (str): Начало тега
+    
+    Returns:
+        int: Количество удаленных из кэша клиентов
+    """
+    _negative_tags.pop_prefix(prefix)
+    return _clients_cache.pop_prefix(prefix)
+
+def invalidate_all():
+    """
+    Полностью очищает кэш клиентов.
+    """
+    _clients_cache.clear()
+    _negative_tags.clear()
+
 def add_client(name, tag):
     """
     Добавляет нового клиента в БД.
@@ -94,47 +218,36 @@ def add_client(name, tag):
         str: ID добавленного клиента или None в случае ошибки
     """
     try:
-        conn = get_connection()
-        if not conn:
-            return None
-        
-        cursor = conn.cursor()
-        
-        # Проверяем, существует ли клиент с таким тегом
-        cursor.execute('SELECT id FROM clients WHERE tag = ?', (tag,))
-        existing_client = cursor.fetchone()
-        
-        if existing_client:
-            logger.warning(f"Клиент с тегом '{tag}' уже существует.")
-            conn.close()
-            return None
-        
-        # Генерируем уникальный ID для клиента
-        client_id = str(uuid.uuid4())
-        
-        # Добавляем нового клиента
-        cursor.execute('''
-        INSERT INTO clients (id, name, tag)
-        VALUES (?, ?, ?)
-        ''', (
-            client_id,
-            name,
-            tag
-        ))
-        
-        conn.commit()
-        conn.close()
-        
-        # Обновляем кэш
-        load_clients()
+        with db_cursor() as (conn, cursor):
+            # Проверяем, существует ли клиент с таким тегом
+            cursor.execute('SELECT id FROM clients WHERE tag = ?', (tag,))
+            existing_client = cursor.fetchone()
+            
+            if existing_client:
+                logger.warning(f"Клиент с тегом '{tag}' уже существует.")
+                return None
+            
+            # Генерируем уникальный ID для клиента (32 hex-символа без дефисов)
+            client_id = uuid.uuid4().hex
+            
+            # Добавляем нового клиента
+            cursor.execute('''
+            INSERT INTO clients (id, name, tag)
+            VALUES (?, ?, ?)
+            ''', (
+                client_id,
+                name,
+                tag
+            ))
+        
+        # Сбрасываем кэш для тега нового клиента
+        invalidate_client(tag)
         
         logger.info(f"Добавлен новый клиент: {name} с тегом '{tag}'.")
         return client_id
     
     except Exception as e:
         logger.error(f"Ошибка при добавлении клиента: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
         return None
 
 def update_client(client_id, **kwargs):
@@ -149,55 +262,74 @@ def update_client(client_id, **kwargs):
         bool: True, если обновление успешно, иначе False
     """
     try:
-        conn = get_connection()
-        if not conn:
-            return False
-        
-        cursor = conn.cursor()
-        
-        # Проверяем существование клиента
-        cursor.execute('SELECT id FROM clients WHERE id = ?', (client_id,))
-        if not cursor.fetchone():
-            logger.warning(f"Клиент с ID {client_id} не найден.")
-            conn.close()
-            return False
-        
-        # Формируем SQL-запрос для обновления
-        set_clauses = []
-        params = []
-        
-        for key, value in kwargs.items():
-            if key in ['name', 'tag']:
-                set_clauses.append(f"{key} = ?")
-                params.append(value)
-        
-        if not set_clauses:
-            logger.warning("Нет параметров для обновления.")
-            conn.close()
-            return False
-        
-        # Добавляем ID клиента в параметры
-        params.append(client_id)
-        
-        # Выполняем запрос на обновление
-        query = f"UPDATE clients SET {', '.join(set_clauses)} WHERE id = ?"
-        cursor.execute(query, params)
-        
-        conn.commit()
-        conn.close()
+        with db_cursor() as (conn, cursor):
+            # Проверяем существование клиента
+            cursor.execute('SELECT id FROM clients WHERE id = ?', (client_id,))
+            if not cursor.fetchone():
+                logger.warning(f"Клиент с ID {client_id} не найден.")
+                return False
+            
+            # Формируем SQL-запрос для обновления
+            set_clauses = []
+            params = []
+            
+            for key, value in kwargs.items():
+                if key in ['name', 'tag']:
+                    set_clauses.append(f"{key} = ?")
+                    params.append(value)
+            
+            if not set_clauses:
+                logger.warning("Нет параметров для обновления.")
+                return False
+            
+            # Добавляем ID клиента в параметры
+            params.append(client_id)
+            
+            # Выполняем запрос на обновление
+            query = f"UPDATE clients SET {', '.join(set_clauses)} WHERE id = ?"
+            cursor.execute(query, params)
         
-        # Обновляем кэш
-        load_clients()
+        # Тег клиента мог измениться, поэтому сбрасываем кэш целиком
+        invalidate_all()
         
         logger.info(f"Клиент {client_id} успешно обновлен.")
         return True
     
     except Exception as e:
         logger.error(f"Ошибка при обновлении клиента {client_id}: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
         return False
 
+def iter_all_clients():
+    """
+    Последовательно возвращает всех клиентов, не загружая таблицу в память целиком.
+    
+    Клиенты читаются частями по CLIENTS_FETCH_SIZE, каждая часть в своей
+    короткой транзакции: пока вызывающий код обрабатывает клиентов,
+    транзакция не держится открытой.
+    
+    Yields:
+        dict: Данные о клиенте
+    """
+    last_id = ''
+    while True:
+        try:
+            with db_cursor() as (conn, cursor):
+                cursor.execute(
+                    'SELECT * FROM clients WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, CLIENTS_FETCH_SIZE)
+                )
+                clients = [dict(client) for client in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error(f"Ошибка при получении списка клиентов: {e}")
+            return
+        
+        yield from clients
+        
+        if len(clients) < CLIENTS_FETCH_SIZE:
+            return
+        last_id = clients[-1]['id']
+
 def get_all_clients():
     """
     Возвращает список всех клиентов.
@@ -205,24 +337,7 @@ def get_all_clients():
     Returns:
         list: Список словарей с данными о клиентах
     """
-    try:
-        conn = get_connection()
-        if not conn:
-            return []
-        
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM clients')
-        clients = cursor.fetchall()
-        
-        conn.close()
-        
-        return [dict(client) for client in clients]
-    
-    except Exception as e:
-        logger.error(f"Ошибка при получении списка клиентов: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
-        return []
+    return list(iter_all_clients())
 
 def add_client_to_config(client_config):
     """
@@ -273,15 +388,9 @@ def get_client_by_name(name):
         dict: Данные о клиенте или None, если клиент не найден
     """
     try:
-        conn = get_connection()
-        if not conn:
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM clients WHERE name = ?', (name,))
-        client = cursor.fetchone()
-        
-        conn.close()
+        with db_cursor() as (conn, cursor):
+            cursor.execute('SELECT * FROM clients WHERE name = ?', (name,))
+            client = cursor.fetchone()
         
         if client:
             return dict(client)
@@ -291,6 +400,4 @@ def get_client_by_name(name):
     
     except Exception as e:
         logger.error(f"Ошибка при поиске клиента по имени '{name}': {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
         return None 
\ No newline at end of file
@@ -4,12 +4,36 @@
 Отвечает за отправку данных в Google таблицы клиентов.
 """
 from datetime import datetime
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-from src.setup import CREDENTIALS_PATH, SCOPES, logger
-from src.db import get_connection
+from src.setup import logger
+from src.db import db_cursor
+from src.service import get_google_sheets_service, reset_google_sheets_service, is_auth_error
+
+_SQL_SHEET_STATUS = '''
+UPDATE leads
+SET sheet_delivery_status = ?,
+    delivery_attempts = delivery_attempts + CASE WHEN ? THEN 0 ELSE 1 END,
+    sheet_delivery_time = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE sheet_delivery_time END
+WHERE id = ?
+'''
+
+def _update_sheet_status(lead_id, status, delivered):
+    """
+    Записывает статус доставки лида в таблицу клиента.
+    
+    Использует постоянное соединение с БД текущего потока.
+    
+    Args:
+        lead_id (str): ID лида
+        status (str): Статус доставки
+        delivered (bool): True, если лид доставлен
+    """
+    try:
+        with db_cursor() as (conn, cursor):
+            cursor.execute(_SQL_SHEET_STATUS, (status, delivered, delivered, lead_id))
+    except Exception as e:
+        logger.error(f"Не удалось обновить статус доставки в таблицу для лида {lead_id}: {e}")
 
 def send_to_client_sheet(client_config, lead_data):
     """
@@ -28,33 +52,15 @@ def send_to_client_sheet(client_config, lead_data):
             logger.warning(f"Для клиента {client_config.get('name')} не настроена Google таблица.")
             
             # Обновляем статус доставки
-            conn = get_connection()
-            if conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                UPDATE leads
-                SET sheet_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-                WHERE id = ?
-                ''', ('error: no sheet configured', lead_data.get('id')))
-                conn.commit()
-                conn.close()
+            _update_sheet_status(lead_data.get('id'), 'error: no sheet configured', False)
             
             return False
         
         # Получаем сервис для работы с Google Sheets
-        service = get_sheets_service()
+        service = get_google_sheets_service()
         if not service:
             # Обновляем статус доставки
-            conn = get_connection()
-            if conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                UPDATE leads
-                SET sheet_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-                WHERE id = ?
-                ''', ('error: failed to get sheets service', lead_data.get('id')))
-                conn.commit()
-                conn.close()
+            _update_sheet_status(lead_data.get('id'), 'error: failed to get sheets service', False)
             
             return False
         
@@ -97,16 +103,7 @@ def send_to_client_sheet(client_config, lead_data):
         ).execute()
         
         # Обновляем статус доставки в БД
-        conn = get_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            UPDATE leads
-            SET sheet_delivery_status = ?, sheet_delivery_time = CURRENT_TIMESTAMP
-            WHERE id = ?
-            ''', ('delivered', lead_data.get('id')))
-            conn.commit()
-            conn.close()
+        _update_sheet_status(lead_data.get('id'), 'delivered', True)
         
         logger.info(f"Данные лида {lead_data.get('id')} успешно отправлены в таблицу клиента {client_config.get('name')}.")
         return True
@@ -114,18 +111,11 @@ def send_to_client_sheet(client_config, lead_data):
     except HttpError as error:
         error_message = f"Ошибка Google API при отправке данных в таблицу клиента: {error}"
         logger.error(error_message)
+        if is_auth_error(error):
+            reset_google_sheets_service()
         
         # Обновляем статус доставки
-        conn = get_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            UPDATE leads
-            SET sheet_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-            WHERE id = ?
-            ''', (f'error: API error - {str(error)[:100]}', lead_data.get('id')))
-            conn.commit()
-            conn.close()
+        _update_sheet_status(lead_data.get('id'), f'error: API error - {str(error)[:100]}', False)
         
         return False
     except Exception as e:
@@ -133,36 +123,10 @@ def send_to_client_sheet(client_config, lead_data):
         logger.error(error_message)
         
         # Обновляем статус доставки
-        conn = get_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            UPDATE leads
-            SET sheet_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-            WHERE id = ?
-            ''', (f'error: {str(e)[:100]}', lead_data.get('id')))
-            conn.commit()
-            conn.close()
+        _update_sheet_status(lead_data.get('id'), f'error: {str(e)[:100]}', False)
         
         return False
 
-def get_sheets_service():
-    """
-    Создаёт и возвращает сервис для работы с Google Sheets API.
-    
-    Returns:
-        Объект сервиса Google Sheets API или None в случае ошибки.
-    """
-    try:
-        credentials = service_account.Credentials.from_service_account_file(
-            CREDENTIALS_PATH, scopes=SCOPES
-        )
-        service = build('sheets', 'v4', credentials=credentials)
-        return service
-    except Exception as e:
-        logger.error(f"Ошибка аутентификации в Google Sheets: {e}")
-        return None
-
 def check_client_sheet_access(spreadsheet_id, sheet_name):
     """
     Проверяет доступность таблицы клиента и наличие указанного листа.
@@ -175,39 +139,31 @@ def check_client_sheet_access(spreadsheet_id, sheet_name):
         bool: True, если таблица и лист доступны, иначе False
     """
     try:
-        service = get_sheets_service()
+        service = get_google_sheets_service()
         if not service:
             return False
         
-        # Получаем информацию о таблице
+        # Получаем только названия листов, без остальных метаданных таблицы.
+        # Успешный ответ уже подтверждает права на чтение таблицы.
         spreadsheet = service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id
+            spreadsheetId=spreadsheet_id,
+            fields='sheets.properties.title'
         ).execute()
         
         # Проверяем наличие указанного листа
-        sheets = spreadsheet.get('sheets', [])
-        sheet_exists = False
-        
-        for sheet in sheets:
-            if sheet['properties']['title'] == sheet_name:
-                sheet_exists = True
-                break
+        titles = {sheet['properties']['title'] for sheet in spreadsheet.get('sheets', [])}
         
-        if not sheet_exists:
+        if sheet_name not in titles:
             logger.warning(f"Лист '{sheet_name}' не найден в таблице {spreadsheet_id}.")
             return False
         
-        # Проверяем права доступа, пытаясь прочитать данные
-        service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=f"{sheet_name}!A1:A1"
-        ).execute()
-        
         logger.info(f"Таблица {spreadsheet_id}, лист '{sheet_name}' доступны.")
         return True
     
     except HttpError as error:
         logger.error(f"Ошибка доступа к таблице {spreadsheet_id}: {error}")
+        if is_auth_error(error):
+            reset_google_sheets_service()
         return False
     except Exception as e:
         logger.error(f"Неожиданная ошибка при проверке доступа к таблице: {e}")
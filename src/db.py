@@ -3,10 +3,31 @@
 
 Отвечает за инициализацию БД и базовые операции с данными.
 """
+import atexit
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from src.setup import logger, get_db_path
 
+# SQL-запросы, используемые в горячих функциях модуля
+_SQL_CLIENT_BY_TAG = 'SELECT * FROM clients WHERE tag = ? LIMIT 1'
+_SQL_UPDATE_LEAD_CLIENT = 'UPDATE leads SET client_id = ? WHERE id = ?'
+_SQL_MARK_LEAD_SENT = 'UPDATE leads SET sent_at = CURRENT_TIMESTAMP WHERE id = ?'
+_SQL_INSERT_LEAD = 'INSERT OR IGNORE INTO leads (id, phone, tag, created_at) VALUES (?, ?, ?, ?)'
+_SQL_CLIENTS_VERSION = "SELECT value FROM meta WHERE key = 'clients_version'"
+
+# Максимальное количество параметров в одном запросе SELECT ... IN (...)
+_SQL_IN_CHUNK_SIZE = 500
+
+# Путь к файлу БД, вычисляется один раз при импорте
+_DB_PATH = get_db_path()
+
+# Постоянные соединения с БД: по одному на поток, закрываются при выходе
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
 def init_db():
     """
     Инициализирует базу данных и создает необходимые таблицы.
@@ -15,65 +36,93 @@ def init_db():
         bool: True, если инициализация прошла успешно, иначе False
     """
     try:
-        conn = get_connection()
-        if not conn:
-            return False
-        
-        cursor = conn.cursor()
-        
-        # Создаем таблицу клиентов
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clients (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            tag TEXT UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Создаем таблицу лидов
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS leads (
-            id TEXT PRIMARY KEY,
-            phone TEXT,
-            tag TEXT,
-            client_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            sent_at TIMESTAMP,
-            delivery_attempts INTEGER DEFAULT 0,
-            crm_delivery_status TEXT,
-            crm_delivery_time TIMESTAMP,
-            FOREIGN KEY (client_id) REFERENCES clients (id)
-        )
-        ''')
-        
-        # Создаем таблицу для сырых данных webhook
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS raw_webhooks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            json_file TEXT,
-            vid TEXT,
-            phones TEXT,
-            source_timestamp TEXT,
-            page TEXT,
-            raw_json TEXT,
-            processed INTEGER DEFAULT 0,
-            processed_at TIMESTAMP,
-            processing_result TEXT
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with db_cursor() as (conn, cursor):
+            # Создаем таблицу клиентов
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clients (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                tag TEXT UNIQUE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            
+            # Создаем таблицу лидов
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS leads (
+                id TEXT PRIMARY KEY,
+                phone TEXT,
+                tag TEXT,
+                client_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP,
+                delivery_attempts INTEGER DEFAULT 0,
+                crm_delivery_status TEXT,
+                crm_delivery_time TIMESTAMP,
+                FOREIGN KEY (client_id) REFERENCES clients (id)
+            )
+            ''')
+            
+            # Создаем таблицу для сырых данных webhook
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS raw_webhooks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                json_file TEXT,
+                vid TEXT,
+                phones TEXT,
+                source_timestamp TEXT,
+                page TEXT,
+                raw_json TEXT,
+                processed INTEGER DEFAULT 0,
+                processed_at TIMESTAMP,
+                processing_result TEXT
+            )
+            ''')
+            
+            # Индекс для выборки сырых данных за период
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_raw_webhooks_timestamp
+            ON raw_webhooks (timestamp)
+            ''')
+            
+            # Индекс для поиска клиента по имени
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_clients_name
+            ON clients (name)
+            ''')
+            
+            # Частичный индекс для поиска ещё не отправленных лидов
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_leads_sent_at
+            ON leads (sent_at) WHERE sent_at IS NULL
+            ''')
+            
+            # Служебные значения, общие для всех процессов
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('clients_version', 0)")
+            
+            # Версия таблицы клиентов увеличивается при любом её изменении,
+            # в том числе из сторонних скриптов, и сбрасывает кэши клиентов
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS clients_version_{event.lower()}
+                AFTER {event} ON clients
+                BEGIN
+                    UPDATE meta SET value = value + 1 WHERE key = 'clients_version';
+                END
+                ''')
         
         logger.info("База данных успешно инициализирована.")
         return True
     
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
         return False
 
 def get_connection():
@@ -84,14 +133,155 @@ def get_connection():
         sqlite3.Connection: Объект соединения с БД или None в случае ошибки
     """
     try:
-        conn = sqlite3.connect(get_db_path())
+        # isolation_level=None отключает неявные BEGIN модуля sqlite3,
+        # транзакции открываются явно в db_cursor
+        conn = sqlite3.connect(
+            _DB_PATH,
+            check_same_thread=False,
+            cached_statements=256,
+            isolation_level=None
+        )
         conn.row_factory = sqlite3.Row
+        
+        # WAL и synchronous=NORMAL убирают лишний fsync на каждую транзакцию,
+        # остальные параметры действуют только в пределах соединения;
+        # mmap_size позволяет читать файл БД через отображение в память
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-64000')
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA mmap_size=268435456')
         return conn
     
     except Exception as e:
         logger.error(f"Ошибка при подключении к базе данных: {e}")
         return None
 
+def _get_conn():
+    """
+    Возвращает постоянное соединение с БД для текущего потока.
+    
+    Соединение создается при первом обращении и переиспользуется,
+    поэтому pragma и кэш подготовленных запросов sqlite3 сохраняются
+    между вызовами.
+    
+    Returns:
+        sqlite3.Connection: Объект соединения с БД или None в случае ошибки
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = get_connection()
+        if conn is None:
+            return None
+        
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    
+    return conn
+
+def _close_connections():
+    """
+    Закрывает все постоянные соединения с БД при завершении процесса.
+    
+    Перед закрытием выполняется PRAGMA optimize: SQLite обновляет
+    статистику планировщика запросов только для таблиц, где она устарела.
+    """
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.execute('PRAGMA optimize')
+                conn.close()
+            except Exception:
+                pass
+        _connections.clear()
+
+atexit.register(_close_connections)
+
+@contextmanager
+def _transaction(begin):
+    """
+    Открывает транзакцию на постоянном соединении текущего потока.
+    
+    Если транзакция уже открыта, блок выполняется в точке сохранения
+    внутри нее: ошибка откатывает только изменения этого блока.
+    
+    Args:
+        begin (str): Команда начала транзакции (BEGIN или BEGIN IMMEDIATE)
+    
+    Yields:
+        sqlite3.Connection: Соединение с БД
+    
+    Raises:
+        sqlite3.OperationalError: Если не удалось подключиться к БД
+    """
+    conn = _get_conn()
+    if not conn:
+        raise sqlite3.OperationalError("Не удалось подключиться к базе данных")
+    
+    if conn.in_transaction:
+        conn.execute('SAVEPOINT nested')
+        try:
+            yield conn
+            conn.execute('RELEASE nested')
+        except BaseException:
+            # BaseException: при GeneratorExit и KeyboardInterrupt точка
+            # сохранения тоже должна быть закрыта
+            conn.execute('ROLLBACK TO nested')
+            conn.execute('RELEASE nested')
+            raise
+        return
+    
+    conn.execute(begin)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        # Иначе транзакция осталась бы открытой на постоянном соединении,
+        # и все следующие блоки потока выполнялись бы внутри нее
+        conn.rollback()
+        raise
+
+@contextmanager
+def db_cursor():
+    """
+    Контекстный менеджер для выполнения запросов к БД.
+    
+    Использует постоянное соединение текущего потока. Открывает транзакцию
+    явным BEGIN, фиксирует её при успешном выходе из блока и откатывает
+    при исключении. Внутри transaction() блок выполняется в рамках
+    уже открытой транзакции.
+    
+    Yields:
+        tuple: (sqlite3.Connection, sqlite3.Cursor)
+    
+    Raises:
+        sqlite3.OperationalError: Если не удалось подключиться к БД
+    """
+    with _transaction('BEGIN') as conn:
+        yield conn, conn.cursor()
+
+@contextmanager
+def transaction():
+    """
+    Объединяет несколько операций с БД в одну транзакцию.
+    
+    Транзакция открывается через BEGIN IMMEDIATE, поэтому блокировка
+    на запись берется сразу. Функции модуля, вызванные внутри блока,
+    работают с тем же соединением, и вся группа фиксируется одним COMMIT.
+    Сетевые запросы внутри блока выполнять не следует, чтобы не удерживать
+    блокировку.
+    
+    Yields:
+        sqlite3.Connection: Соединение с БД
+    
+    Raises:
+        sqlite3.OperationalError: Если не удалось подключиться к БД
+    """
+    with _transaction('BEGIN IMMEDIATE') as conn:
+        yield conn
+
 def get_client_by_tag(tag):
     """
     Получает информацию о клиенте по тегу.
@@ -103,15 +293,9 @@ def get_client_by_tag(tag):
         dict: Данные о клиенте или None, если клиент не найден
     """
     try:
-        conn = get_connection()
-        if not conn:
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM clients WHERE tag = ?', (tag,))
-        client = cursor.fetchone()
-        
-        conn.close()
+        with db_cursor() as (conn, cursor):
+            cursor.execute(_SQL_CLIENT_BY_TAG, (tag,))
+            client = cursor.fetchone()
         
         if client:
             return dict(client)
@@ -119,8 +303,24 @@ def get_client_by_tag(tag):
     
     except Exception as e:
         logger.error(f"Ошибка при получении клиента по тегу: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
+        return None
+
+def get_clients_version():
+    """
+    Возвращает текущую версию таблицы клиентов.
+    
+    Returns:
+        int: Версия таблицы клиентов или None в случае ошибки
+    """
+    try:
+        with db_cursor() as (conn, cursor):
+            cursor.execute(_SQL_CLIENTS_VERSION)
+            row = cursor.fetchone()
+        
+        return row[0] if row else None
+    
+    except Exception as e:
+        logger.error(f"Ошибка при получении версии таблицы клиентов: {e}")
         return None
 
 def update_lead_client(lead_id, client_id):
@@ -134,27 +334,29 @@ def update_lead_client(lead_id, client_id):
     Returns:
         bool: True, если обновление успешно, иначе False
     """
+    return update_lead_clients([(lead_id, client_id)])
+
+def update_lead_clients(pairs):
+    """
+    Обновляет информацию о клиенте для нескольких лидов одной транзакцией.
+    
+    Args:
+        pairs (list): Список пар (lead_id, client_id)
+    
+    Returns:
+        bool: True, если обновление успешно, иначе False
+    """
+    if not pairs:
+        return True
+    
     try:
-        conn = get_connection()
-        if not conn:
-            return False
-        
-        cursor = conn.cursor()
-        cursor.execute('''
-        UPDATE leads
-        SET client_id = ?
-        WHERE id = ?
-        ''', (client_id, lead_id))
-        
-        conn.commit()
-        conn.close()
+        with db_cursor() as (conn, cursor):
+            cursor.executemany(_SQL_UPDATE_LEAD_CLIENT, [(client_id, lead_id) for lead_id, client_id in pairs])
         
         return True
     
     except Exception as e:
-        logger.error(f"Ошибка при обновлении клиента для лида: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
+        logger.error(f"Ошибка при обновлении клиента для лидов: {e}")
         return False
 
 def mark_lead_as_sent(lead_id):
@@ -167,27 +369,29 @@ def mark_lead_as_sent(lead_id):
     Returns:
         bool: True, если обновление успешно, иначе False
     """
+    return mark_leads_as_sent([lead_id])
+
+def mark_leads_as_sent(lead_ids):
+    """
+    Помечает несколько лидов как отправленные одной транзакцией.
+    
+    Args:
+        lead_ids (list): Список ID лидов
+    
+    Returns:
+        bool: True, если обновление успешно, иначе False
+    """
+    if not lead_ids:
+        return True
+    
     try:
-        conn = get_connection()
-        if not conn:
-            return False
-        
-        cursor = conn.cursor()
-        cursor.execute('''
-        UPDATE leads
-        SET sent_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-        ''', (lead_id,))
-        
-        conn.commit()
-        conn.close()
+        with db_cursor() as (conn, cursor):
+            cursor.executemany(_SQL_MARK_LEAD_SENT, [(lead_id,) for lead_id in lead_ids])
         
         return True
     
     except Exception as e:
-        logger.error(f"Ошибка при обновлении статуса отправки лида: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
+        logger.error(f"Ошибка при обновлении статуса отправки лидов: {e}")
         return False
 
 def insert_lead(lead_data):
@@ -205,42 +409,79 @@ def insert_lead(lead_data):
         bool: True, если лид успешно добавлен, иначе False
     """
     try:
-        conn = get_connection()
-        if not conn:
-            return False
-        
-        cursor = conn.cursor()
-        
-        # Проверяем, существует ли лид с таким ID
-        cursor.execute('SELECT id FROM leads WHERE id = ?', (lead_data['id'],))
-        if cursor.fetchone():
-            logger.warning(f"Лид с ID {lead_data['id']} уже существует в базе.")
-            conn.close()
-            return False
-        
-        # Преобразуем created_at в строку, если это datetime объект
-        created_at = lead_data['created_at']
-        if isinstance(created_at, datetime):
-            created_at = created_at.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Добавляем новый лид
-        cursor.execute('''
-        INSERT INTO leads (id, phone, tag, created_at)
-        VALUES (?, ?, ?, ?)
-        ''', (
-            lead_data['id'],
-            lead_data['phone'],
-            lead_data['tag'],
-            created_at
-        ))
-        
-        conn.commit()
-        conn.close()
+        with db_cursor() as (conn, cursor):
+            # Преобразуем created_at в строку, если это datetime объект
+            created_at = lead_data['created_at']
+            if isinstance(created_at, datetime):
+                created_at = created_at.strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Добавляем новый лид, дубликат по ID отбрасывается первичным ключом
+            cursor.execute(_SQL_INSERT_LEAD, (
+                lead_data['id'],
+                lead_data['phone'],
+                lead_data['tag'],
+                created_at
+            ))
+            
+            if cursor.rowcount == 0:
+                logger.warning("Лид с ID %s уже существует в базе.", lead_data['id'])
+                return False
         
-        logger.info(f"Лид {lead_data['id']} успешно добавлен в базу.")
+        logger.info("Лид %s успешно добавлен в базу.", lead_data['id'])
         return True
     
     except Exception as e:
-        logger.debug(f"Ошибка при добавлении лида в БД: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
\ No newline at end of file
+        logger.debug("Ошибка при добавлении лида в БД: %s", e)
+        return False
+
+def insert_leads_bulk(leads):
+    """
+    Добавляет несколько лидов в базу данных одной транзакцией.
+    
+    Лиды, уже существующие в базе, и повторы внутри пакета пропускаются.
+    
+    Args:
+        leads (list): Список словарей с данными о лидах (см. insert_lead)
+    
+    Returns:
+        list: Список ID лидов, которые были добавлены
+    """
+    if not leads:
+        return []
+    
+    try:
+        with db_cursor() as (conn, cursor):
+            # Находим ID, которые уже есть в базе
+            ids = list({lead['id'] for lead in leads})
+            existing = set()
+            for start in range(0, len(ids), _SQL_IN_CHUNK_SIZE):
+                chunk = ids[start:start + _SQL_IN_CHUNK_SIZE]
+                placeholders = ', '.join('?' * len(chunk))
+                cursor.execute(f'SELECT id FROM leads WHERE id IN ({placeholders})', chunk)
+                existing.update(row[0] for row in cursor)
+            
+            # Формируем строки для вставки, пропуская дубликаты
+            rows = []
+            inserted_ids = []
+            for lead in leads:
+                lead_id = lead['id']
+                if lead_id in existing:
+                    logger.warning("Лид с ID %s уже существует в базе.", lead_id)
+                    continue
+                existing.add(lead_id)
+                
+                created_at = lead['created_at']
+                if isinstance(created_at, datetime):
+                    created_at = created_at.strftime('%Y-%m-%d %H:%M:%S')
+                
+                rows.append((lead_id, lead['phone'], lead['tag'], created_at))
+                inserted_ids.append(lead_id)
+            
+            cursor.executemany(_SQL_INSERT_LEAD, rows)
+        
+        logger.info("Добавлено %d лидов в базу.", len(inserted_ids))
+        return inserted_ids
+    
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном добавлении лидов в БД: {e}")
+        return []
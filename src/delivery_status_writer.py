@@ -0,0 +1,149 @@
+"""
+Модуль для записи статусов доставки лидов в CRM.
+
+Отвечает за накопление результатов доставки в памяти и их пакетную
+запись в БД фоновым потоком. Через него статусы записывают все модули
+доставки (вебхуки CRM клиентов и Битрикс24).
+"""
+import atexit
+import threading
+from collections import deque
+
+from src.setup import logger
+from src.db import db_cursor
+
+# Интервал записи накопленных статусов в секундах
+FLUSH_INTERVAL = 1.0
+
+# Количество статусов, при котором запись выполняется не дожидаясь интервала
+FLUSH_BATCH_SIZE = 200
+
+# Максимальное количество статусов, возвращаемых в очередь после ошибки записи
+RETRY_QUEUE_MAXSIZE = 10000
+
+# Один запрос для любого исхода: при успехе обновляется время доставки,
+# при ошибке увеличивается счетчик попыток
+_SQL_UPDATE_STATUS = '''
+UPDATE leads
+SET crm_delivery_status = ?,
+    delivery_attempts = delivery_attempts + CASE WHEN ? THEN 0 ELSE 1 END,
+    crm_delivery_time = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE crm_delivery_time END
+WHERE id = ?
+'''
+
+# Накопленные статусы: (is_success, status, lead_id)
+_pending = deque()
+_pending_lock = threading.Lock()
+
+# Сигнал фоновому потоку записать статусы раньше интервала
+_flush_event = threading.Event()
+_stop_event = threading.Event()
+_writer_thread = None
+_writer_lock = threading.Lock()
+
+def enqueue(lead_id, status, is_success):
+    """
+    Ставит статус доставки лида в очередь на запись в БД.
+    
+    Args:
+        lead_id (str): ID лида
+        status (str): Статус доставки ('delivered' или описание ошибки)
+        is_success (bool): True, если лид доставлен
+    """
+    _start_writer()
+    
+    with _pending_lock:
+        _pending.append((is_success, status, lead_id))
+        size = len(_pending)
+    
+    if size >= FLUSH_BATCH_SIZE:
+        _flush_event.set()
+
+def flush():
+    """
+    Записывает в БД все накопленные статусы доставки.
+    
+    При ошибке записи (например, БД заблокирована) статусы возвращаются
+    в начало очереди и записываются при следующем вызове.
+    
+    Returns:
+        bool: True, если запись прошла успешно, иначе False
+    """
+    with _pending_lock:
+        if not _pending:
+            return True
+        
+        items = list(_pending)
+        _pending.clear()
+    
+    try:
+        with db_cursor() as (conn, cursor):
+            cursor.executemany(_SQL_UPDATE_STATUS, [
+                (status, is_success, is_success, lead_id) for is_success, status, lead_id in items
+            ])
+        
+        return True
+    
+    except Exception as e:
+        logger.error(f"Ошибка при записи статусов доставки ({len(items)} шт.): {e}")
+        _requeue(items)
+        return False
+
+def _requeue(items):
+    """
+    Возвращает незаписанные статусы в начало очереди.
+    
+    Очередь ограничена RETRY_QUEUE_MAXSIZE: если места не хватает,
+    отбрасываются самые старые статусы.
+    
+    Args:
+        items (list): Статусы в порядке поступления
+    """
+    with _pending_lock:
+        room = max(0, RETRY_QUEUE_MAXSIZE - len(_pending))
+        dropped = max(0, len(items) - room)
+        _pending.extendleft(reversed(items[dropped:]))
+    
+    if dropped:
+        logger.error(f"Очередь статусов доставки переполнена, потеряно статусов: {dropped}")
+
+def _start_writer():
+    """
+    Запускает фоновый поток записи статусов, если он еще не запущен.
+    """
+    global _writer_thread
+    
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(
+                target=_writer_loop,
+                name='delivery-status-writer',
+                daemon=True
+            )
+            _writer_thread.start()
+
+def _writer_loop():
+    """
+    Записывает накопленные статусы раз в FLUSH_INTERVAL секунд
+    или при накоплении FLUSH_BATCH_SIZE статусов.
+    """
+    while not _stop_event.is_set():
+        _flush_event.wait(FLUSH_INTERVAL)
+        _flush_event.clear()
+        flush()
+
+def _stop_writer():
+    """
+    Останавливает фоновый поток и записывает оставшиеся статусы
+    при завершении процесса.
+    """
+    _stop_event.set()
+    _flush_event.set()
+    if _writer_thread is not None and _writer_thread.is_alive():
+        _writer_thread.join(timeout=10)
+    flush()
+
+atexit.register(_stop_writer)
@@ -0,0 +1,88 @@
+"""
+Модуль HTTP-сессий для обращения к внешним API.
+
+Отвечает за создание сессий requests с пулом постоянных соединений,
+чтобы TCP- и TLS-соединения переиспользовались между запросами.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Заголовки, которые сессия добавляет ко всем запросам. Connection: keep-alive
+# и Accept-Encoding: gzip, deflate requests выставляет сам
+SESSION_HEADERS = {'User-Agent': 'LeadsToB24/1.0'}
+
+# Коды ответа, при которых POST повторяется: сервер не обработал запрос.
+# После 500/502/504 лид мог быть уже создан, и повтор дал бы дубликат
+POST_RETRY_STATUSES = frozenset({429, 503})
+
+# Максимальная пауза перед повтором в секундах, даже если Retry-After больше
+MAX_RETRY_AFTER = 30
+
+class _SafeRetry(Retry):
+    """
+    Политика повторов, безопасная для POST-запросов.
+    
+    POST повторяется только при ответах POST_RETRY_STATUSES и не повторяется
+    после ошибки чтения ответа (запрос мог дойти до сервера). Пауза по
+    заголовку Retry-After ограничена MAX_RETRY_AFTER секундами.
+    """
+    
+    def _is_method_retryable(self, method):
+        if method.upper() == 'POST':
+            return False
+        return super()._is_method_retryable(method)
+    
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == 'POST':
+            return bool(self.allowed_methods and 'POST' in self.allowed_methods
+                        and status_code in POST_RETRY_STATUSES)
+        return super().is_retry(method, status_code, has_retry_after)
+    
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER)
+
+def create_session(pool_connections=16, pool_maxsize=32, retry_post=False):
+    """
+    Создает сессию requests с пулом соединений и повтором при сбоях.
+    
+    Повтор по коду ответа учитывает заголовок Retry-After (не дольше
+    MAX_RETRY_AFTER секунд). Если попытки исчерпаны, возвращается
+    последний ответ, а не исключение.
+    
+    Args:
+        pool_connections (int): Количество хостов, для которых хранится пул
+        pool_maxsize (int): Максимальное количество соединений с одним хостом
+        retry_post (bool): Повторять POST-запросы при ответах POST_RETRY_STATUSES
+    
+    Returns:
+        requests.Session: Настроенная сессия
+    """
+    # По умолчанию POST не входит в методы для повтора по коду ответа,
+    # и повторяются только запросы, не дошедшие до сервера
+    allowed_methods = Retry.DEFAULT_ALLOWED_METHODS
+    if retry_post:
+        allowed_methods = allowed_methods | {'POST'}
+    
+    retries = _SafeRetry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=allowed_methods,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retries
+    )
+    
+    session = requests.Session()
+    session.headers.update(SESSION_HEADERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
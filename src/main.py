@@ -3,18 +3,20 @@
 
 Координирует работу всех остальных модулей.
 """
-import time
 import sys
 from datetime import datetime
 
 from src.setup import logger
-from src.sheets import get_new_rows, mark_row_as_processed
-from src.processor import process_row
-from src.db import insert_lead, init_db
-from src.router import route_lead
+from src.sheets import get_new_rows, mark_rows_as_processed
+from src.processor import process_rows_from_list
+from src.db import insert_leads_bulk, update_lead_clients, mark_leads_as_sent, transaction, init_db
+from src.router import find_client, deliver_lead
 from src.client_config import load_clients
 from src.scheduler import run_scheduler
 
+# Количество строк, отметки об обработке которых отправляются одним запросом
+MARK_BATCH_SIZE = 100
+
 def process_new_leads():
     """
     Обрабатывает новые записи из исходной таблицы.
@@ -43,39 +45,59 @@ def process_new_leads():
         
         logger.info(f"Найдено {len(rows)} новых записей.")
         
-        # Обрабатываем каждую строку
-        for i, row in enumerate(rows):
-            try:
-                # Обрабатываем данные строки
-                processed_data = process_row(row)
-                if not processed_data:
-                    logger.warning(f"Не удалось обработать строку {i+1}.")
-                    continue
-                
-                # Добавляем запись в БД
-                if not insert_lead(processed_data):
-                    logger.warning(f"Не удалось добавить запись в БД: {processed_data['id']}.")
+        # Обрабатываем данные всех строк одним пакетом
+        processed_rows = []
+        leads = process_rows_from_list([row for _, row in rows])
+        for (i, _), processed_data in zip(rows, leads):
+            if not processed_data:
+                logger.warning("Не удалось обработать строку %d.", i + 1)
+                continue
+            
+            processed_rows.append((i, processed_data))
+        
+        # Добавляем записи и привязываем их к клиентам одной транзакцией,
+        # сетевые запросы в нее не входят
+        routed_rows = []
+        with transaction():
+            inserted_ids = set(insert_leads_bulk([data for _, data in processed_rows]))
+            
+            for i, processed_data in processed_rows:
+                if processed_data['id'] not in inserted_ids:
+                    logger.warning("Не удалось добавить запись в БД: %s.", processed_data['id'])
                     continue
                 
-                # Маршрутизируем запись соответствующему клиенту
-                if not route_lead(processed_data):
-                    logger.warning(f"Не удалось маршрутизировать запись: {processed_data['id']}.")
+                client = find_client(processed_data)
+                if not client:
+                    logger.warning("Не удалось маршрутизировать запись: %s.", processed_data['id'])
                     continue
                 
-                # Помечаем строку как обработанную
-                if not mark_row_as_processed(i):
-                    logger.warning(f"Не удалось пометить строку {i+1} как обработанную.")
+                routed_rows.append((i, processed_data, client))
+            
+            update_lead_clients([(data['id'], client['id']) for _, data, client in routed_rows])
+        
+        # Отправляем записи клиентам
+        sent_ids = []
+        processed_indices = []
+        for i, processed_data, client in routed_rows:
+            try:
+                if not deliver_lead(processed_data, client):
+                    logger.warning("Не удалось маршрутизировать запись: %s.", processed_data['id'])
                     continue
                 
-                logger.info(f"Запись {processed_data['id']} успешно обработана.")
+                # Отметки об отправке и обработке строк записываются пакетами
+                sent_ids.append(processed_data['id'])
+                processed_indices.append(i)
+                if len(processed_indices) >= MARK_BATCH_SIZE:
+                    flush_processed_marks(sent_ids, processed_indices)
                 
-                # Небольшая пауза между обработкой строк для снижения нагрузки на API
-                time.sleep(0.2)
+                logger.info("Запись %s успешно обработана.", processed_data['id'])
             
             except Exception as e:
-                logger.error(f"Ошибка при обработке строки {i+1}: {e}")
+                logger.error("Ошибка при обработке строки %d: %s", i + 1, e)
                 continue
         
+        flush_processed_marks(sent_ids, processed_indices)
+        
         logger.info("Обработка новых записей завершена.")
         return True
     
@@ -83,6 +105,28 @@ def process_new_leads():
         logger.error(f"Неожиданная ошибка при обработке данных: {e}")
         return False
 
+def flush_processed_marks(lead_ids, row_indices):
+    """
+    Записывает накопленные отметки об отправке лидов и обработке строк
+    и очищает списки.
+    
+    Args:
+        lead_ids (list): ID отправленных лидов
+        row_indices (list): Индексы обработанных строк
+    """
+    if not row_indices:
+        return
+    
+    # Сначала отмечаем лиды в БД одной транзакцией, затем строки в таблице
+    if not mark_leads_as_sent(lead_ids):
+        logger.warning("Не удалось пометить лиды %s как отправленные.", ', '.join(lead_ids))
+    lead_ids.clear()
+    
+    if not mark_rows_as_processed(row_indices):
+        logger.warning("Не удалось пометить строки %s как обработанные.",
+                       ', '.join(str(i + 2) for i in row_indices))
+    row_indices.clear()
+
 def main():
     """
     Основная функция программы.
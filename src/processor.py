@@ -4,8 +4,33 @@
 Отвечает за очистку и подготовку данных перед записью в БД.
 """
 import re
+import uuid
 from datetime import datetime
-from src.setup import logger
+import pandas as pd
+from src.setup import logger, COLUMN_INDICES
+
+# Регулярные выражения, используемые при обработке каждой строки
+_PREFIX_RE = re.compile(r'^([BВ]\d+_)')
+
+# Первые буквы префикса (латинская и кириллическая): регулярное выражение
+# запускается только для тегов, которые с них начинаются
+_PREFIX_STARTS = ('B', 'В')
+_NONDIGIT_RE = re.compile(r'\D')
+
+# Телефон после очистки: "7" и еще 10 цифр
+_PHONE_RE = re.compile(r'7\d{10}')
+
+# Позиции столбцов исходной таблицы, вычисляются один раз при импорте
+_MAX_COL_IDX = max(COLUMN_INDICES.values())
+_IDX_CREATED = COLUMN_INDICES['created_at']
+_IDX_ID = COLUMN_INDICES['id']
+_IDX_PHONE = COLUMN_INDICES['phone']
+_IDX_TAG = COLUMN_INDICES['project_tag']
+
+# Таблица для удаления всех ASCII-символов, кроме цифр, через str.translate
+_DELETE_NONDIGITS = str.maketrans('', '', ''.join(
+    chr(c) for c in range(128) if not chr(c).isdigit()
+))
 
 def clean_project_tag(tag):
     """
@@ -22,7 +47,8 @@ def clean_project_tag(tag):
         clean_tag = tag.strip()
         
         # Удаляем префикс вида "B1_" или "В2_", но только если это именно префикс
-        clean_tag = re.sub(r'^([BВ]\d+_)', '', clean_tag)
+        if clean_tag.startswith(_PREFIX_STARTS):
+            clean_tag = _PREFIX_RE.sub('', clean_tag)
         
         # Удаляем хвост после второго подчёркивания (если есть)
         parts = clean_tag.split('_', 2)
@@ -33,7 +59,7 @@ def clean_project_tag(tag):
         clean_tag = clean_tag.strip()
         
         # Логируем преобразование тега для отладки
-        logger.debug(f"Исходный тег: '{tag}', очищенный тег: '{clean_tag}'")
+        logger.debug("Исходный тег: '%s', очищенный тег: '%s'", tag, clean_tag)
         
         return clean_tag
     except Exception as e:
@@ -51,11 +77,14 @@ def validate_phone(phone):
         str: Отформатированный номер телефона или пустая строка, если формат неверный
     """
     try:
-        # Удаляем все нецифровые символы
-        digits_only = re.sub(r'\D', '', str(phone))
+        # Удаляем все нецифровые ASCII-символы, остальные (например,
+        # неразрывный пробел из Excel) убираем регулярным выражением
+        digits_only = str(phone).translate(_DELETE_NONDIGITS)
+        if not digits_only.isdecimal():
+            digits_only = _NONDIGIT_RE.sub('', digits_only)
         
         # Проверяем, что номер соответствует формату "79XXXXXXXXX"
-        if re.match(r'^7\d{10}$', digits_only):
+        if len(digits_only) == 11 and digits_only[0] == '7':
             return digits_only
         else:
             logger.warning(f"Некорректный формат телефона: {phone}")
@@ -77,40 +106,161 @@ def parse_datetime(date_str):
     try:
         if not date_str:  # Если дата не указана
             return datetime.now()  # Возвращаем текущее время
-        return datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
+        # fromisoformat принимает "YYYY-MM-DD HH:MM:SS" (пробел как разделитель)
+        # и работает значительно быстрее strptime
+        return datetime.fromisoformat(date_str)
     except Exception as e:
         logger.error(f"Ошибка при парсинге даты '{date_str}': {e}")
         return datetime.now()  # В случае ошибки возвращаем текущее время
 
-def process_row(data):
+def _build_lead(created_at, lead_id, phone, project_tag):
     """
-    Обрабатывает данные, полученные через webhook.
+    Формирует данные лида из исходных значений полей.
     
     Args:
-        data (dict): Словарь с данными лида
+        created_at (str): Дата создания в формате "YYYY-MM-DD HH:MM:SS"
+        lead_id (str): ID лида или пустое значение
+        phone (str): Номер телефона
+        project_tag (str): Исходный тег проекта
+    
+    Returns:
+        dict: Словарь с обработанными данными или None, если телефон некорректен
+    """
+    cleaned_phone = validate_phone(phone)
+    if not cleaned_phone:
+        logger.warning("Некорректный телефон: %s", phone)
+        return None
+    
+    return {
+        'created_at': parse_datetime(created_at),
+        'id': lead_id or str(int(datetime.now().timestamp())),
+        'phone': cleaned_phone,
+        'tag': clean_project_tag(project_tag),
+        'original_tag': project_tag
+    }
+
+def process_row_from_list(row):
+    """
+    Обрабатывает строку, полученную из исходной Google таблицы.
+    
+    Args:
+        row (list): Значения ячеек строки, расположенные согласно COLUMN_INDICES
     
     Returns:
         dict: Словарь с обработанными данными или None, если данные некорректны
     """
     try:
-        # Валидируем и обрабатываем данные
-        created_at = parse_datetime(data.get('created_at', ''))
-        cleaned_phone = validate_phone(data.get('phone', ''))
-        if not cleaned_phone:
-            logger.warning(f"Некорректный телефон: {data.get('phone')}")
-            return None
+        # Дополняем короткую строку пустыми значениями
+        if len(row) <= _MAX_COL_IDX:
+            row = row + [''] * (_MAX_COL_IDX + 1 - len(row))
         
-        cleaned_tag = clean_project_tag(data.get('project_tag', ''))
+        return _build_lead(
+            row[_IDX_CREATED],
+            row[_IDX_ID],
+            row[_IDX_PHONE],
+            row[_IDX_TAG]
+        )
+    
+    except Exception as e:
+        logger.error(f"Ошибка при обработке строки {row}: {e}")
+        return None
+
+def process_rows_from_list(rows):
+    """
+    Обрабатывает пакет строк из исходной Google таблицы.
+    
+    Очистка телефонов, тегов и разбор дат выполняются векторно
+    над столбцами DataFrame, а не отдельно для каждой строки.
+    
+    Args:
+        rows (list): Список строк, значения ячеек расположены согласно COLUMN_INDICES
+    
+    Returns:
+        list: Словари с обработанными данными в порядке строк,
+              None на месте некорректных строк
+    """
+    if not rows:
+        return []
+    
+    try:
+        # Короткие строки дополняются пустыми значениями при выравнивании столбцов
+        df = pd.DataFrame(rows).reindex(columns=range(_MAX_COL_IDX + 1))
+        df = df.fillna('').astype(str)
+        
+        created_at = df[_IDX_CREATED]
+        lead_ids = df[_IDX_ID]
+        phones = df[_IDX_PHONE]
+        tags = df[_IDX_TAG]
+        
+        # Оставляем в телефоне только цифры и проверяем формат "79XXXXXXXXX"
+        clean_phones = phones.str.replace(_NONDIGIT_RE, '', regex=True)
+        valid = clean_phones.str.fullmatch(_PHONE_RE)
+        
+        # Удаляем префикс вида "B1_" и хвост после второго подчёркивания
+        clean_tags = (
+            tags.str.strip()
+            .str.replace(_PREFIX_RE, '', regex=True)
+            .str.split('_', n=2)
+            .str[:2]
+            .str.join('_')
+            .str.strip()
+        )
         
-        # Формируем результат
-        return {
-            'created_at': created_at,
-            'id': data.get('id', str(int(datetime.now().timestamp()))),
-            'phone': cleaned_phone,
-            'tag': cleaned_tag,
-            'original_tag': data.get('project_tag', '')
-        }
+        # Пустые и некорректные даты заменяются текущим временем
+        now = datetime.now()
+        dates = pd.to_datetime(created_at, format='ISO8601', errors='coerce')
+        for date_str in created_at[dates.isna() & (created_at != '')]:
+            logger.error("Ошибка при парсинге даты '%s'", date_str)
+        
+        # Запасной ID для строк без ID: время пакета общее для всех строк,
+        # поэтому к нему добавляется случайный суффикс, иначе лиды пакета
+        # получили бы одинаковый ID и все, кроме первого, были бы отброшены
+        timestamp = int(now.timestamp())
+        
+        leads = []
+        for is_valid, date, lead_id, phone, clean_phone, tag, original_tag in zip(
+            valid, dates, lead_ids, phones, clean_phones, clean_tags, tags
+        ):
+            if not is_valid:
+                logger.warning("Некорректный телефон: %s", phone)
+                leads.append(None)
+                continue
+            
+            leads.append({
+                'created_at': now if pd.isna(date) else date.to_pydatetime(),
+                'id': lead_id or f"{timestamp}_{uuid.uuid4().hex[:12]}",
+                'phone': clean_phone,
+                'tag': tag,
+                'original_tag': original_tag
+            })
+        
+        return leads
+    
+    except Exception as e:
+        logger.error(f"Ошибка при пакетной обработке строк: {e}")
+        return [process_row_from_list(row) for row in rows]
+
+def process_row_from_webhook(data):
+    """
+    Обрабатывает данные, полученные через webhook.
+    
+    Args:
+        data (dict): Словарь с данными лида
+    
+    Returns:
+        dict: Словарь с обработанными данными или None, если данные некорректны
+    """
+    try:
+        return _build_lead(
+            data.get('created_at', ''),
+            data.get('id'),
+            data.get('phone', ''),
+            data.get('project_tag', '')
+        )
     
     except Exception as e:
         logger.error(f"Ошибка при обработке данных {data}: {e}")
-        return None 
\ No newline at end of file
+        return None
+
+# Совместимость со старым именем функции обработки данных webhook
+process_row = process_row_from_webhook
@@ -0,0 +1,67 @@
+"""
+Модуль ограничения частоты запросов.
+
+Отвечает за равномерное распределение обращений к внешним API,
+чтобы не превышать их лимиты.
+"""
+import threading
+import time
+from functools import wraps
+
+class RateLimiter:
+    """
+    Ограничитель частоты вызовов по алгоритму "ведро токенов".
+    
+    Допускает всплеск до calls вызовов, после чего пропускает
+    не более calls вызовов за period секунд.
+    """
+    
+    def __init__(self, calls, period=1.0):
+        """
+        Args:
+            calls (int): Количество вызовов, разрешенных за период
+            period (float): Длительность периода в секундах
+        """
+        self.capacity = calls
+        self.rate = calls / period
+        self.tokens = float(calls)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """
+        Забирает один токен, при необходимости ожидая его появления.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            
+            # Резервируем токен сразу, а ждем уже вне блокировки
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        
+        if wait:
+            time.sleep(wait)
+
+def rate_limited(calls, period=1.0):
+    """
+    Декоратор, ограничивающий частоту вызовов функции.
+    
+    Args:
+        calls (int): Количество вызовов, разрешенных за период
+        period (float): Длительность периода в секундах
+    
+    Returns:
+        function: Декоратор
+    """
+    limiter = RateLimiter(calls, period)
+    
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            limiter.acquire()
+            return func(*args, **kwargs)
+        return wrapper
+    
+    return decorator
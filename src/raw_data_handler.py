@@ -3,16 +3,50 @@
 
 Отвечает за сохранение входящих данных в JSON-файлы и БД.
 """
-import json
+import atexit
 import os
-from datetime import datetime
-from pathlib import Path
+import queue
+import sqlite3
+import threading
+import orjson
+from datetime import datetime, timezone
+from pathlib import Path, PosixPath, WindowsPath
 from src.setup import logger, get_db_path
-from src.db import get_connection
+from src.db import get_connection, db_cursor
+
+# Пути к JSON-файлам передаются в запросы без ручного приведения к строке
+# (адаптер ищется по точному типу, поэтому регистрируем конкретные классы)
+for _path_type in (PosixPath, WindowsPath):
+    sqlite3.register_adapter(_path_type, str)
+
+# Директория для JSON-файлов с сырыми данными
+RAW_DATA_DIR = Path("logs/raw_data")
+
+# Максимальное количество записей, сохраняемых одной транзакцией
+WRITE_BATCH_SIZE = 64
+
+_SQL_INSERT_RAW_WEBHOOK = '''
+INSERT INTO raw_webhooks 
+(timestamp, json_file, vid, phones, source_timestamp, page, raw_json)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Максимальное количество записей, ожидающих сохранения
+WRITE_QUEUE_MAXSIZE = 10000
+
+# Очередь сырых данных и фоновый поток, который записывает их на диск и в БД
+_write_queue = queue.Queue(maxsize=WRITE_QUEUE_MAXSIZE)
+_writer_thread = None
+_writer_lock = threading.Lock()
 
 def save_raw_data(data):
     """
-    Сохраняет сырые данные в JSON-файл и БД.
+    Ставит сырые данные в очередь на сохранение в JSON-файл и БД.
+    
+    Запись выполняется фоновым потоком, поэтому функция не блокирует
+    обработку входящего запроса. Если очередь переполнена, данные
+    сохраняются сразу в текущем потоке, что замедляет прием запросов,
+    пока запись не догонит поступление данных.
     
     Args:
         data (dict): Входящие данные от webhook
@@ -21,56 +55,124 @@ def save_raw_data(data):
         tuple: (success, message)
     """
     try:
-        # Создаем директорию для сырых данных если её нет
-        raw_data_dir = Path("logs/raw_data")
-        raw_data_dir.mkdir(parents=True, exist_ok=True)
+        # Имя файла формируется по времени получения данных
+        now = datetime.now()
+        timestamp = now.strftime('%Y%m%d_%H%M%S_%f')
         
-        # Генерируем имя файла на основе времени
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        json_path = raw_data_dir / f"{timestamp}.json"
+        _start_writer()
+        json_path = RAW_DATA_DIR / f"{timestamp}.json"
+        try:
+            _write_queue.put_nowait((timestamp, now, data))
+        except queue.Full:
+            logger.warning("Очередь сохранения сырых данных переполнена, запись выполняется синхронно.")
+            RAW_DATA_DIR.mkdir(parents=True, exist_ok=True)
+            _write_batch([(timestamp, now, data)])
+            return True, f"Данные сохранены в {json_path}"
         
-        # Сохраняем в JSON
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                'timestamp': datetime.now().isoformat(),
-                'raw_data': data
-            }, f, ensure_ascii=False, indent=2)
+        return True, f"Данные поставлены в очередь на сохранение в {json_path}"
         
-        # Сохраняем в БД базовую информацию для анализа
-        conn = get_connection()
-        if conn:
-            cursor = conn.cursor()
+    except Exception as e:
+        error_msg = f"Ошибка при сохранении сырых данных: {e}"
+        logger.error(error_msg)
+        return False, error_msg
+
+def _start_writer():
+    """
+    Запускает фоновый поток записи сырых данных, если он еще не запущен.
+    """
+    global _writer_thread
+    
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(
+                target=_writer_loop,
+                name='raw-data-writer',
+                daemon=True
+            )
+            _writer_thread.start()
+
+def _writer_loop():
+    """
+    Забирает записи из очереди пакетами и сохраняет их.
+    
+    Завершается, получив из очереди None.
+    """
+    RAW_DATA_DIR.mkdir(parents=True, exist_ok=True)
+    
+    while True:
+        batch = [_write_queue.get()]
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                batch.append(_write_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        stop = None in batch
+        _write_batch([item for item in batch if item is not None])
+        for _ in batch:
+            _write_queue.task_done()
+        
+        if stop:
+            return
+
+def _write_batch(batch):
+    """
+    Сохраняет пакет сырых данных в JSON-файлы и одной транзакцией в БД.
+    
+    Args:
+        batch (list): Список кортежей (timestamp, received_at, data),
+                      где received_at - время получения данных (datetime)
+    """
+    rows = []
+    for timestamp, received_at, data in batch:
+        try:
+            # Сериализуем данные один раз: готовый JSON встраивается в файл
+            # через orjson.Fragment и записывается в БД
+            raw_json = orjson.dumps(data)
             
-            # Получаем основные поля, если они есть
-            vid = data.get('vid', '')
-            phones = ','.join(data.get('phones', []))
-            timestamp_data = data.get('time', '')
-            page = data.get('page', '')
+            # Сохраняем в JSON
+            json_path = RAW_DATA_DIR / f"{timestamp}.json"
+            json_path.write_bytes(orjson.dumps({
+                'timestamp': received_at.isoformat(),
+                'raw_data': orjson.Fragment(raw_json)
+            }))
             
-            # Сохраняем запись
-            cursor.execute('''
-            INSERT INTO raw_webhooks 
-            (timestamp, json_file, vid, phones, source_timestamp, page, raw_json)
-            VALUES (CURRENT_TIMESTAMP, ?, ?, ?, ?, ?, ?)
-            ''', (
-                str(json_path),
-                str(vid),
-                phones,
-                str(timestamp_data),
-                page,
-                json.dumps(data, ensure_ascii=False)
+            # Сохраняем в БД базовую информацию для анализа. Время записи
+            # совпадает со временем в имени файла, но хранится, как и раньше
+            # (CURRENT_TIMESTAMP), в UTC и без долей секунды
+            rows.append((
+                received_at.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                json_path,
+                str(data.get('vid', '')),
+                ','.join(data.get('phones', [])),
+                str(data.get('time', '')),
+                data.get('page', ''),
+                raw_json.decode('utf-8')
             ))
             
-            conn.commit()
-            conn.close()
-        
-        logger.info(f"Сырые данные сохранены в {json_path}")
-        return True, f"Данные сохранены в {json_path}"
+            logger.info(f"Сырые данные сохранены в {json_path}")
         
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении сырых данных: {e}")
+    
+    if not rows:
+        return
+    
+    try:
+        with db_cursor() as (conn, cursor):
+            cursor.executemany(_SQL_INSERT_RAW_WEBHOOK, rows)
     except Exception as e:
-        error_msg = f"Ошибка при сохранении сырых данных: {e}"
-        logger.error(error_msg)
-        return False, error_msg
+        logger.error(f"Ошибка при записи сырых данных в БД: {e}")
+
+def _stop_writer():
+    """
+    Дожидается сохранения оставшихся в очереди данных при завершении процесса.
+    """
+    if _writer_thread is not None and _writer_thread.is_alive():
+        _write_queue.put(None)
+        _writer_thread.join(timeout=10)
+
+atexit.register(_stop_writer)
 
 def analyze_saved_data(start_date=None, end_date=None):
     """
@@ -3,11 +3,121 @@
 
 Отвечает за определение клиента по тегу и маршрутизацию данных.
 """
+from concurrent.futures import ThreadPoolExecutor
+
 from src.setup import logger
 from src.client_config import get_client_by_tag_cached
 from src.bitrix24 import send_to_bitrix24
 from src.db import update_lead_client, mark_lead_as_sent
 
+# Пул потоков для одновременной доставки лида в несколько систем
+_delivery_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='delivery')
+
+def _send_to_bitrix24(client, lead_data):
+    """
+    Обработчик доставки лида в Битрикс24.
+    
+    Args:
+        client (dict): Данные о клиенте
+        lead_data (dict): Данные о лиде
+    
+    Returns:
+        bool: True, если лид отправлен, иначе False
+    """
+    return send_to_bitrix24(lead_data)
+
+# Обработчики, от которых зависит пометка лида как отправленного
+REQUIRED_HANDLERS = frozenset({_send_to_bitrix24})
+
+# Обработчики доставки по ID клиента. Хранятся отдельно, чтобы не менять
+# записи клиентов в общем кэше client_config
+_client_handlers = {}
+
+def get_client_handlers(client):
+    """
+    Возвращает обработчики доставки лидов для клиента.
+    
+    Набор обработчиков определяется один раз для клиента и запоминается
+    по его ID, поэтому при маршрутизации каждого лида не собирается заново.
+    Сейчас все лиды доставляются только в Битрикс24.
+    
+    Args:
+        client (dict): Данные о клиенте
+    
+    Returns:
+        tuple: Функции вида handler(client, lead_data) -> bool
+    """
+    client_id = client.get('id')
+    handlers = _client_handlers.get(client_id)
+    if handlers is None:
+        handlers = _client_handlers[client_id] = (_send_to_bitrix24,)
+    
+    return handlers
+
+def find_client(lead_data):
+    """
+    Определяет клиента для лида по тегу.
+    
+    Args:
+        lead_data (dict): Данные о лиде
+    
+    Returns:
+        dict: Данные о клиенте или None, если клиент не найден
+    """
+    tag = lead_data.get('tag')
+    if not tag:
+        logger.warning("Лид %s не имеет тега для маршрутизации.", lead_data.get('id'))
+        return None
+    
+    # Определяем клиента по тегу
+    client = get_client_by_tag_cached(tag)
+    if not client:
+        logger.warning("Не найден клиент для тега '%s'.", tag)
+        return None
+    
+    logger.info("Найден клиент '%s' для тега '%s'.", client.get('name'), tag)
+    return client
+
+def deliver_lead(lead_data, client):
+    """
+    Отправляет лид всем обработчикам доставки клиента без изменения
+    записи лида в БД.
+    
+    Args:
+        lead_data (dict): Данные о лиде
+        client (dict): Данные о клиенте
+    
+    Returns:
+        bool: True, если лид доставлен всеми обязательными обработчиками
+        (REQUIRED_HANDLERS), иначе False
+    """
+    lead_id = lead_data.get('id')
+    logger.info("Отправка лида %s для клиента '%s'", lead_id, client.get('name'))
+    
+    # Если систем несколько, запросы к ним выполняются одновременно
+    handlers = get_client_handlers(client)
+    if len(handlers) == 1:
+        results = [bool(handlers[0](client, lead_data))]
+    else:
+        futures = [_delivery_executor.submit(handler, client, lead_data) for handler in handlers]
+        results = [bool(future.result()) for future in futures]
+    
+    delivered = True
+    for handler, result in zip(handlers, results):
+        if result:
+            continue
+        if handler in REQUIRED_HANDLERS:
+            delivered = False
+        else:
+            logger.warning("Обработчик %s не доставил лид %s.", handler.__name__, lead_id)
+    
+    if delivered:
+        logger.info("Лид %s успешно отправлен.", lead_id)
+        return True
+    
+    logger.error("Не удалось отправить лид %s.", lead_id)
+    return False
+
 def route_lead(lead_data):
     """
     Маршрутизирует лид в Битрикс24.
@@ -18,36 +128,22 @@ def route_lead(lead_data):
     Returns:
         bool: True, если маршрутизация прошла успешно, иначе False
     """
+    lead_id = lead_data.get('id')
     try:
-        tag = lead_data.get('tag')
-        if not tag:
-            logger.warning(f"Лид {lead_data.get('id')} не имеет тега для маршрутизации.")
-            return False
-        
-        # Определяем клиента по тегу
-        client = get_client_by_tag_cached(tag)
+        client = find_client(lead_data)
         if not client:
-            logger.warning(f"Не найден клиент для тега '{tag}'.")
             return False
         
-        logger.info(f"Найден клиент '{client.get('name')}' для тега '{tag}'.")
-        
         # Обновляем информацию о клиенте в записи лида
-        update_lead_client(lead_data.get('id'), client.get('id'))
+        update_lead_client(lead_id, client.get('id'))
         
-        # Отправляем лид в Битрикс24
-        logger.info(f"Отправка лида {lead_data.get('id')} в Битрикс24 для клиента '{client.get('name')}'")
-        bitrix_result = send_to_bitrix24(lead_data)
-        
-        if bitrix_result:
-            # Если лид успешно отправлен, помечаем его как отправленный
-            mark_lead_as_sent(lead_data.get('id'))
-            logger.info(f"Лид {lead_data.get('id')} успешно отправлен в Битрикс24.")
-            return True
-        else:
-            logger.error(f"Не удалось отправить лид {lead_data.get('id')} в Битрикс24.")
+        # Отправляем лид в Битрикс24 и при успехе помечаем его как отправленный
+        if not deliver_lead(lead_data, client):
             return False
+        
+        mark_lead_as_sent(lead_id)
+        return True
     
     except Exception as e:
-        logger.error(f"Ошибка при маршрутизации лида {lead_data.get('id')}: {e}")
-        return False 
\ No newline at end of file
+        logger.error("Ошибка при маршрутизации лида %s: %s", lead_id, e)
+        return False
@@ -13,6 +13,9 @@ def run_scheduler(job_function):
     """
     Запускает планировщик с заданной функцией.
     
+    Между запусками поток спит до ближайшей задачи по расписанию,
+    а не просыпается каждую секунду.
+    
     Args:
         job_function (callable): Функция, которая будет выполняться по расписанию
     """
@@ -25,14 +28,26 @@ def run_scheduler(job_function):
     logger.info("Выполняем первоначальную проверку...")
     job_function()
     
+    # Пауза после ошибки: растет экспоненциально и сбрасывается после успешного прохода
+    backoff = 1.0
+    
     # Бесконечный цикл для выполнения запланированных задач
     while True:
         try:
+            next_delay = schedule.idle_seconds()
+            time.sleep(max(0, next_delay) if next_delay is not None else 1)
             schedule.run_pending()
-            time.sleep(1)
+            
+            backoff = 1.0
         except Exception as e:
-            logger.error(f"Ошибка в планировщике: {e}")
-            time.sleep(60)  # Пауза перед повторной попыткой в случае ошибки
+            if backoff == 1.0:
+                logger.warning(f"Ошибка в планировщике: {e}")
+            else:
+                logger.error(f"Ошибка в планировщике: {e}")
+            
+            # Пауза перед повторной попыткой
+            time.sleep(backoff)
+            backoff = min(60.0, backoff * 2)
 
 def run_scheduler_background(job_function):
     """
@@ -3,24 +3,74 @@
 
 Содержит функции для получения экземпляров сервисов Google API.
 """
+import threading
+import orjson
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
 
 from src.setup import CREDENTIALS_PATH, SCOPES, logger
 
+# Сервис Google Sheets API кэшируется отдельно для каждого потока:
+# транспорт httplib2 внутри сервиса не потокобезопасен. Поколение
+# увеличивается при сбросе, чтобы все потоки создали сервис заново
+_local = threading.local()
+_generation = 0
+_generation_lock = threading.Lock()
+
+class OrjsonModel(JsonModel):
+    """
+    Модель запросов Google API, сериализующая JSON через orjson.
+    
+    Повторяет поведение JsonModel, но кодирует тела запросов и разбирает
+    ответы быстрее стандартного модуля json.
+    """
+    
+    def serialize(self, body_value):
+        if isinstance(body_value, dict) and 'data' not in body_value and self._data_wrapper:
+            body_value = {'data': body_value}
+        return orjson.dumps(body_value)
+    
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        
+        if self._data_wrapper and 'data' in body:
+            body = body['data']
+        return body
+
 def get_google_sheets_service():
     """
-    Создаёт и возвращает сервис для работы с Google Sheets API.
+    Возвращает закэшированный для текущего потока сервис Google Sheets API.
+    
+    Сервис создаётся при первом обращении из потока и переиспользуется
+    им; discovery-документ берётся из установленного пакета, а не
+    загружается по сети. google-auth обновляет токен в том же объекте
+    учетных данных, поэтому кэш остается рабочим.
     
     Returns:
         Объект сервиса Google Sheets API или None в случае ошибки.
     """
+    service = getattr(_local, 'service', None)
+    if service is not None and _local.generation == _generation:
+        return service
+    
     try:
         credentials = service_account.Credentials.from_service_account_file(
             CREDENTIALS_PATH, scopes=SCOPES
         )
-        service = build('sheets', 'v4', credentials=credentials)
+        service = build(
+            'sheets', 'v4',
+            credentials=credentials,
+            cache_discovery=False,
+            static_discovery=True,
+            model=OrjsonModel()
+        )
+        _local.service = service
+        _local.generation = _generation
         logger.debug("Сервис Google Sheets API успешно получен.")
         return service
     except HttpError as error:
@@ -28,4 +78,28 @@ def get_google_sheets_service():
         return None
     except Exception as e:
         logger.error(f"Ошибка аутентификации в Google Sheets: {e}")
-        return None 
\ No newline at end of file
+        return None
+
+def reset_google_sheets_service():
+    """
+    Сбрасывает закэшированные сервисы Google Sheets API.
+    
+    Вызывается при ошибках авторизации, чтобы при следующем обращении
+    каждый поток создал сервис заново.
+    """
+    global _generation
+    with _generation_lock:
+        _generation += 1
+    _local.service = None
+
+def is_auth_error(error):
+    """
+    Проверяет, что ошибка Google API связана с авторизацией (HTTP 401).
+    
+    Args:
+        error (HttpError): Ошибка Google API
+    
+    Returns:
+        bool: True, если это ошибка авторизации
+    """
+    return getattr(error.resp, 'status', None) == 401
@@ -4,8 +4,12 @@
 Загружает настройки из .env файла и предоставляет их другим модулям.
 """
 import os
+import atexit
+import queue
+from types import MappingProxyType
 from dotenv import load_dotenv
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
 # Загрузка переменных окружения из .env файла
@@ -34,6 +38,30 @@ def get_db_path():
     """
     return DB_PATH
 
+# Файл учетных данных сервисного аккаунта Google
+CREDENTIALS_PATH = os.getenv('CREDENTIALS_PATH', 'sheets-credentials.json')
+if not os.path.isabs(CREDENTIALS_PATH):
+    CREDENTIALS_PATH = str(BASE_DIR / CREDENTIALS_PATH)
+
+# Права доступа к Google Sheets API
+SCOPES = ('https://www.googleapis.com/auth/spreadsheets',)
+
+# Исходная таблица с лидами
+SOURCE_SPREADSHEET_ID = os.getenv('SOURCE_SPREADSHEET_ID', '')
+SOURCE_SHEET_NAME = os.getenv('SOURCE_SHEET_NAME', '')
+
+# Интервал проверки новых записей в минутах
+CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', 10))
+
+# Индексы колонок в исходной таблице (лист A:I), только для чтения
+COLUMN_INDICES = MappingProxyType({
+    'created_at': 0,
+    'id': 1,
+    'phone': 2,
+    'project_tag': 3,
+    'already_sent': 8
+})
+
 # Настройки для логирования
 LOG_FILE = str(LOGS_DIR / 'leads_to_b24.log')
 LOG_LEVEL = logging.INFO
@@ -42,12 +70,23 @@ def setup_logging():
     """
     Настройка системы логирования.
     
+    Повторный вызов возвращает уже настроенный логгер, не добавляя
+    обработчики второй раз.
+    
+    Логгер только помещает записи в очередь, а запись в файл и вывод
+    в консоль выполняет фоновый поток QueueListener, поэтому рабочие
+    потоки не ждут дискового ввода-вывода.
+    
     Returns:
         logging.Logger: Настроенный логгер
     """
     # Создаем логгер
     logger = logging.getLogger('leads_to_b24')
+    if logger.handlers:
+        return logger
+    
     logger.setLevel(logging.DEBUG)
+    logger.propagate = False
     
     # Форматтер для логов
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -56,7 +95,6 @@ def setup_logging():
     file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
     
     # Консольный handler - только важные сообщения
     console_handler = logging.StreamHandler()
@@ -69,7 +107,15 @@ def setup_logging():
             return "Был создан лид в Битрикс24" in record.getMessage()
     
     console_handler.addFilter(LeadCreationFilter())
-    logger.addHandler(console_handler)
+    
+    # Записи передаются обработчикам через очередь в фоновом потоке
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    
+    # При завершении процесса дописываем оставшиеся в очереди записи
+    atexit.register(listener.stop)
     
     return logger
 
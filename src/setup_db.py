@@ -4,9 +4,39 @@
 Инициализирует БД и добавляет тестовые данные.
 """
 import sys
+import zlib
 
 from src.setup import logger
-from src.db import init_db, get_connection
+from src.db import init_db, db_cursor
+from src.client_config import invalidate_client
+
+# Таблица замены пробелов при построении ID тестового клиента
+_ID_TRANSLATION = str.maketrans({' ': '_'})
+
+def make_client_id(name):
+    """
+    Строит ID тестового клиента по его имени.
+    
+    Args:
+        name (str): Имя клиента
+    
+    Returns:
+        str: ID клиента
+    """
+    return f"test_{name.lower().translate(_ID_TRANSLATION)}"
+
+# Тестовые клиенты: (имя, тег для маршрутизации)
+_RAW_CLIENTS = [
+    ("СуперМет_СП", "[LR115] СуперМет_СП"),
+    ("Диалог Чанган Казань", "[ДМД13] Диалог Чанган Казань"),
+]
+
+# Готовые строки для вставки: (ID, имя, тег), ID вычисляется один раз
+CLIENTS = [(make_client_id(name), name, tag) for name, tag in _RAW_CLIENTS]
+
+# Контрольная сумма списка тестовых клиентов, сохраняется в PRAGMA user_version.
+# hash() для строк меняется между запусками, поэтому используется crc32
+CLIENTS_VERSION = zlib.crc32(repr(CLIENTS).encode('utf-8')) & 0x7fffffff
 
 def setup_database():
     """
@@ -40,41 +70,29 @@ def add_test_client(name, tag):
         str: ID добавленного клиента или None в случае ошибки
     """
     try:
-        conn = get_connection()
-        if not conn:
-            return None
-        
-        cursor = conn.cursor()
-        
-        # Проверяем, существует ли клиент с таким тегом
-        cursor.execute('SELECT id FROM clients WHERE tag = ?', (tag,))
-        existing_client = cursor.fetchone()
-        
-        if existing_client:
-            logger.warning(f"Клиент с тегом '{tag}' уже существует.")
-            conn.close()
-            return None
-        
-        # Добавляем тестового клиента
-        cursor.execute('''
-        INSERT INTO clients (id, name, tag)
-        VALUES (?, ?, ?)
-        ''', (
-            f"test_{name.lower().replace(' ', '_')}",
-            name,
-            tag
-        ))
+        with db_cursor() as (conn, cursor):
+            # Проверяем, существует ли клиент с таким тегом
+            cursor.execute('SELECT id FROM clients WHERE tag = ?', (tag,))
+            existing_client = cursor.fetchone()
+            
+            if existing_client:
+                logger.warning(f"Клиент с тегом '{tag}' уже существует.")
+                return None
+            
+            # Добавляем тестового клиента
+            cursor.execute('''
+            INSERT INTO clients (id, name, tag)
+            VALUES (?, ?, ?)
+            ''', (make_client_id(name), name, tag))
         
-        conn.commit()
-        conn.close()
+        # Тег мог быть закэширован как неизвестный
+        invalidate_client(tag)
         
         logger.info(f"Добавлен тестовый клиент: {name} с тегом '{tag}'.")
         return True
     
     except Exception as e:
         logger.error(f"Ошибка при добавлении тестового клиента: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
         return None
 
 def add_test_data():
@@ -85,17 +103,27 @@ def add_test_data():
         bool: True, если данные добавлены успешно, иначе False
     """
     try:
-        # Добавляем тестовых клиентов
-        add_test_client(
-            name="СуперМет_СП",
-            tag="[LR115] СуперМет_СП"
-        )
+        # Добавляем тестовых клиентов одной транзакцией, уже существующие
+        # теги пропускаются за счет уникального индекса
+        with db_cursor() as (conn, cursor):
+            # Этот же список клиентов уже был добавлен ранее
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] == CLIENTS_VERSION:
+                logger.info("Тестовые данные уже добавлены.")
+                return True
+            
+            cursor.executemany('''
+            INSERT OR IGNORE INTO clients (id, name, tag)
+            VALUES (?, ?, ?)
+            ''', CLIENTS)
+            added = cursor.rowcount
+            
+            cursor.execute(f'PRAGMA user_version = {CLIENTS_VERSION}')
         
-        add_test_client(
-            name="Диалог Чанган Казань",
-            tag="[ДМД13] Диалог Чанган Казань"
-        )
+        for _, _, tag in CLIENTS:
+            invalidate_client(tag)
         
+        logger.info(f"Добавлено тестовых клиентов: {added} из {len(CLIENTS)}.")
         logger.info("Тестовые данные успешно добавлены.")
         return True
     
@@ -4,78 +4,126 @@
 Отвечает за чтение данных из исходной таблицы и обновление статусов обработки.
 """
 import os
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from src.setup import (
-    CREDENTIALS_PATH, SCOPES, SOURCE_SPREADSHEET_ID, 
-    SOURCE_SHEET_NAME, COLUMN_INDICES, logger
+    SOURCE_SPREADSHEET_ID, SOURCE_SHEET_NAME, COLUMN_INDICES, logger
 )
+from src.service import get_google_sheets_service, reset_google_sheets_service, is_auth_error
 
-def get_sheets_service():
-    """
-    Создаёт и возвращает сервис для работы с Google Sheets API.
-    
-    Returns:
-        Объект сервиса Google Sheets API или None в случае ошибки.
-    """
-    try:
-        credentials = service_account.Credentials.from_service_account_file(
-            CREDENTIALS_PATH, scopes=SCOPES
-        )
-        service = build('sheets', 'v4', credentials=credentials)
-        return service
-    except Exception as e:
-        logger.error(f"Ошибка аутентификации в Google Sheets: {e}")
-        return None
+# Позиция колонки "Already sent" в строке
+_ALREADY_SENT_IDX = COLUMN_INDICES['already_sent']
+
+# Максимальное количество отрезков необработанных строк, читаемых выборочно;
+# при большем числе разрывов лист читается целиком
+MAX_ROW_RANGES = 50
 
 def get_new_rows():
     """
     Получает строки из исходной таблицы, которые еще не были обработаны.
     
+    Сначала читается только колонка отметок "Already sent", затем
+    одним запросом batchGet - полные строки для необработанных отрезков,
+    поэтому объем ответа не растет вместе с числом обработанных строк.
+    
     Returns:
-        list: Список строк с данными или пустой список в случае ошибки.
+        list: Список пар (row_index, row), где row_index - индекс строки
+              в таблице начиная с 0 для данных, или пустой список в случае ошибки.
     """
     try:
-        service = get_sheets_service()
+        service = get_google_sheets_service()
         if not service:
             return []
         
-        # Формируем запрос для получения всего листа
-        sheet_range = f"{SOURCE_SHEET_NAME}!A2:I"
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SOURCE_SPREADSHEET_ID,
-            range=sheet_range
-        ).execute()
+        values = service.spreadsheets().values()
         
-        rows = result.get('values', [])
-        if not rows:
-            logger.info("В таблице не найдено данных.")
-            return []
+        # Читаем только колонку отметок об обработке
+        statuses = values.get(
+            spreadsheetId=SOURCE_SPREADSHEET_ID,
+            range=f"{SOURCE_SHEET_NAME}!I2:I",
+            fields='values'
+        ).execute().get('values', [])
         
-        # Фильтруем строки, у которых нет отметки в колонке "Already sent"
-        new_rows = []
-        for row in rows:
-            # Проверяем, что строка имеет достаточную длину
-            if len(row) <= COLUMN_INDICES['already_sent']:
-                # Добавляем пустые элементы, если строка короче ожидаемой
-                row.extend([''] * (COLUMN_INDICES['already_sent'] + 1 - len(row)))
-                
-            # Проверяем наличие отметки в колонке "Already sent"
-            if row[COLUMN_INDICES['already_sent']] != '✅':
-                new_rows.append(row)
+        runs = _unprocessed_runs(statuses)
+        if len(runs) > MAX_ROW_RANGES:
+            # Слишком много разрывов, дешевле прочитать лист целиком
+            rows = values.get(
+                spreadsheetId=SOURCE_SPREADSHEET_ID,
+                range=f"{SOURCE_SHEET_NAME}!A2:I",
+                fields='values'
+            ).execute().get('values', [])
+            new_rows = _filter_new_rows(rows)
+        else:
+            # Читаем необработанные отрезки и все строки ниже последней отметки
+            starts = [start for start, _ in runs] + [len(statuses)]
+            ranges = [f"{SOURCE_SHEET_NAME}!A{start + 2}:I{end + 2}" for start, end in runs]
+            ranges.append(f"{SOURCE_SHEET_NAME}!A{len(statuses) + 2}:I")
+            
+            result = values.batchGet(
+                spreadsheetId=SOURCE_SPREADSHEET_ID,
+                ranges=ranges,
+                fields='valueRanges/values'
+            ).execute()
+            
+            new_rows = []
+            for start, value_range in zip(starts, result.get('valueRanges', [])):
+                new_rows.extend(_filter_new_rows(value_range.get('values', []), start))
         
         logger.info(f"Найдено {len(new_rows)} необработанных строк.")
         return new_rows
     
     except HttpError as error:
         logger.error(f"Ошибка при получении данных из Google Sheets: {error}")
+        if is_auth_error(error):
+            reset_google_sheets_service()
         return []
     except Exception as e:
         logger.error(f"Неожиданная ошибка при получении данных: {e}")
         return []
 
+def _unprocessed_runs(statuses):
+    """
+    Группирует необработанные строки в непрерывные отрезки.
+    
+    Args:
+        statuses (list): Значения колонки "Already sent" по строкам
+    
+    Returns:
+        list: Отрезки [start, end] индексов строк (включительно)
+    """
+    runs = []
+    for row_index, status in enumerate(statuses):
+        if status and status[0] == '✅':
+            continue
+        
+        if runs and runs[-1][1] == row_index - 1:
+            runs[-1][1] = row_index
+        else:
+            runs.append([row_index, row_index])
+    
+    return runs
+
+def _filter_new_rows(rows, start_index=0):
+    """
+    Отбирает строки без отметки в колонке "Already sent".
+    
+    Короткие строки не дополняются: их выравнивает processor.
+    
+    Args:
+        rows (list): Строки таблицы
+        start_index (int): Индекс первой строки в таблице
+    
+    Returns:
+        list: Список пар (row_index, row)
+    """
+    new_rows = []
+    for offset, row in enumerate(rows):
+        already_sent = row[_ALREADY_SENT_IDX] if len(row) > _ALREADY_SENT_IDX else ''
+        if already_sent != '✅':
+            new_rows.append((start_index + offset, row))
+    
+    return new_rows
+
 def mark_row_as_processed(row_index):
     """
     Помечает строку в исходной таблице как обработанную.
@@ -87,30 +135,49 @@ def mark_row_as_processed(row_index):
     Returns:
         bool: True, если обновление прошло успешно, иначе False.
     """
+    return mark_rows_as_processed([row_index])
+
+def mark_rows_as_processed(row_indices):
+    """
+    Помечает несколько строк в исходной таблице как обработанные одним запросом.
+    
+    Args:
+        row_indices (list): Индексы строк в таблице (начиная с 0 для данных, 
+                            реальный индекс в таблице будет row_index + 2)
+    
+    Returns:
+        bool: True, если обновление прошло успешно, иначе False.
+    """
+    if not row_indices:
+        return True
+    
     try:
-        service = get_sheets_service()
+        service = get_google_sheets_service()
         if not service:
             return False
         
-        # Формируем запрос на обновление ячейки
-        range_name = f"{SOURCE_SHEET_NAME}!I{row_index + 2}"
+        # Формируем одно пакетное обновление для всех ячеек
         body = {
-            'values': [['✅']]
+            'valueInputOption': 'RAW',
+            'data': [
+                {'range': f"{SOURCE_SHEET_NAME}!I{row_index + 2}", 'values': [['✅']]}
+                for row_index in row_indices
+            ]
         }
         
-        result = service.spreadsheets().values().update(
+        service.spreadsheets().values().batchUpdate(
             spreadsheetId=SOURCE_SPREADSHEET_ID,
-            range=range_name,
-            valueInputOption='RAW',
             body=body
         ).execute()
         
-        logger.info(f"Строка {row_index + 2} помечена как обработанная.")
+        logger.info(f"Помечено как обработанные строк: {len(row_indices)}.")
         return True
     
     except HttpError as error:
-        logger.error(f"Ошибка при обновлении статуса строки {row_index + 2}: {error}")
+        logger.error(f"Ошибка при обновлении статуса строк: {error}")
+        if is_auth_error(error):
+            reset_google_sheets_service()
         return False
     except Exception as e:
         logger.error(f"Неожиданная ошибка при обновлении статуса: {e}")
-        return False 
\ No newline at end of file
+        return False
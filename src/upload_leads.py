@@ -7,10 +7,10 @@
 """
 
 # Импорт необходимых библиотек
-import time  # Для создания задержек между запросами
 import sys   # Для работы с путями и системными функциями
 import os    # Для работы с файловой системой
 from typing import Dict, Any  # Для типизации данных
+from concurrent.futures import ThreadPoolExecutor, as_completed  # Для параллельной отправки
 import pandas as pd  # Для работы с Excel файлами
 from tkinter import Tk, filedialog  # Для создания диалогового окна выбора файла
 
@@ -22,6 +22,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.bitrix24 import send_to_bitrix24  # Функция для отправки лида в Битрикс24
 from src.setup import logger  # Логгер для записи событий
 
+# Количество одновременных запросов к Битрикс24.
+# Частоту запросов ограничивает сама send_to_bitrix24, а потоки
+# лишь перекрывают ожидание ответов сервера
+UPLOAD_WORKERS = 8
+
 def read_leads_from_excel(file_path: str) -> list[Dict[str, Any]]:
     """
     Читает данные лидов из Excel-файла.
@@ -32,10 +37,9 @@ def read_leads_from_excel(file_path: str) -> list[Dict[str, Any]]:
     Returns:
         list[Dict[str, Any]]: Список словарей с данными лидов
     """
-    leads = []
     try:
-        # Читаем Excel-файл в pandas DataFrame
-        df = pd.read_excel(file_path)
+        # Читаем из Excel-файла только колонку с телефонами, как строки
+        df = pd.read_excel(file_path, usecols=lambda column: column == 'Телефон', dtype=str)
         
         # Проверяем наличие обязательной колонки 'Телефон'
         required_columns = ['Телефон']
@@ -43,24 +47,18 @@ def read_leads_from_excel(file_path: str) -> list[Dict[str, Any]]:
             if column not in df.columns:
                 raise ValueError(f"В файле отсутствует колонка '{column}'")
         
-        # Проходим по каждой строке Excel файла
-        for index, row in df.iterrows():
-            # Получаем телефон и убираем лишние пробелы
-            phone = str(row['Телефон']).strip()
-            
-            # Пропускаем пустые строки и строки с nan (Not a Number)
-            if phone and phone.lower() != 'nan':
-                # Убираем .0 из номера, если телефон был распознан как число
-                phone = phone.replace('.0', '')
-                
-                # Формируем данные лида (телефон)
-                # Остальные поля (источник, этап, ответственный) настроены в bitrix24.py
-                lead_data = {
-                    'phone': phone
-                }
-                
-                leads.append(lead_data)
-                    
+        # Очищаем всю колонку разом: убираем лишние пробелы,
+        # пропускаем пустые значения и nan (Not a Number)
+        phones = df['Телефон'].astype(str).str.strip()
+        phones = phones[(phones != '') & (phones.str.lower() != 'nan')]
+        
+        # Убираем .0 из номера, если телефон был распознан как число
+        phones = phones.str.replace('.0', '', regex=False)
+        
+        # Формируем данные лидов (телефон)
+        # Остальные поля (источник, этап, ответственный) настроены в bitrix24.py
+        leads = [{'phone': phone} for phone in phones.tolist()]
+        
         logger.info(f"Прочитано {len(leads)} лидов из файла")
         return leads
         
@@ -79,21 +77,24 @@ def upload_leads_to_bitrix(leads: list[Dict[str, Any]], config: Dict[str, str])
     total = len(leads)  # Общее количество лидов
     success = 0  # Счетчик успешно созданных лидов
     
-    # Проходим по каждому лиду
-    for index, lead in enumerate(leads, 1):
-        try:
-            # Отправляем лид в Битрикс24 через функцию из bitrix24.py
-            if send_to_bitrix24(lead, config):
-                success += 1
-                print(f"Успешно создан лид {index}/{total}: {lead['phone']}")
-            else:
-                print(f"Не удалось создать лид {index}/{total}: {lead['phone']}")
-            
-            # Пауза 0.5 секунды между запросами, чтобы не перегрузить API Битрикс24
-            time.sleep(0.5)
+    # Отправляем лиды параллельно и выводим результаты по мере готовности
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        futures = {
+            executor.submit(send_to_bitrix24, lead, config): lead
+            for lead in leads
+        }
+        
+        for index, future in enumerate(as_completed(futures), 1):
+            lead = futures[future]
+            try:
+                if future.result():
+                    success += 1
+                    print(f"Успешно создан лид {index}/{total}: {lead['phone']}")
+                else:
+                    print(f"Не удалось создать лид {index}/{total}: {lead['phone']}")
             
-        except Exception as e:
-            print(f"Ошибка при создании лида {lead['phone']}: {e}")
+            except Exception as e:
+                print(f"Ошибка при создании лида {lead['phone']}: {e}")
     
     # Выводим итоговую статистику
     print(f"\nЗагрузка завершена. Успешно: {success}/{total}")
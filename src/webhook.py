@@ -3,12 +3,47 @@
 
 Отвечает за формирование и отправку запросов в CRM клиентов.
 """
-import json
+import orjson
 import requests
 from datetime import datetime
 
 from src.setup import logger
-from src.db import get_connection
+from src import delivery_status_writer as status_writer
+from src.http_session import create_session
+
+# Сессия с пулом соединений, общая для всех запросов к CRM клиентов.
+# Доставка идет параллельно, поэтому пул к одному хосту увеличен.
+# Ответы 429 и 503 (запрос не обработан) повторяются на уровне соединения,
+# статус доставки записывается один раз по итоговому ответу
+_session = create_session(pool_maxsize=64, retry_post=True)
+
+# Заголовки запросов к CRM: тело сериализуется заранее через orjson
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+def _build_payload(lead_data):
+    """
+    Формирует данные лида для отправки в CRM клиента.
+    
+    Args:
+        lead_data (dict): Данные о лиде
+    
+    Returns:
+        dict: Данные для отправки
+    """
+    payload = {
+        'lead_id': lead_data.get('id'),
+        'created_at': lead_data.get('created_at').strftime("%Y-%m-%d %H:%M:%S") if lead_data.get('created_at') else None,
+        'phone': lead_data.get('phone'),
+        'tag': lead_data.get('tag'),
+        'source': 'LeadsToB24',
+        'timestamp': datetime.now().timestamp()
+    }
+    
+    # Добавляем дополнительные данные, если они есть
+    if lead_data.get('original_tag'):
+        payload['original_tag'] = lead_data.get('original_tag')
+    
+    return payload
 
 def send_to_webhook(client_config, lead_data):
     """
@@ -24,41 +59,18 @@ def send_to_webhook(client_config, lead_data):
     try:
         # Проверяем наличие настроек вебхука
         if not client_config.get('use_crm') or not client_config.get('webhook_url'):
+            # Статус доставки не записывается: он следует из настроек клиента
             logger.warning(f"Для клиента {client_config.get('name')} не настроена интеграция с CRM.")
-            
-            # Обновляем статус доставки
-            conn = get_connection()
-            if conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                UPDATE leads
-                SET crm_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-                WHERE id = ?
-                ''', ('error: no CRM configured', lead_data.get('id')))
-                conn.commit()
-                conn.close()
-                
             return False
         
         # Формируем данные для отправки
-        payload = {
-            'lead_id': lead_data.get('id'),
-            'created_at': lead_data.get('created_at').strftime("%Y-%m-%d %H:%M:%S") if lead_data.get('created_at') else None,
-            'phone': lead_data.get('phone'),
-            'tag': lead_data.get('tag'),
-            'source': 'LeadsToB24',
-            'timestamp': datetime.now().timestamp()
-        }
-        
-        # Добавляем дополнительные данные, если они есть
-        if lead_data.get('original_tag'):
-            payload['original_tag'] = lead_data.get('original_tag')
+        payload = _build_payload(lead_data)
         
         # Отправляем данные через вебхук
-        response = requests.post(
+        response = _session.post(
             client_config['webhook_url'],
-            json=payload,
-            headers={'Content-Type': 'application/json'},
+            data=orjson.dumps(payload),
+            headers=_JSON_HEADERS,
             timeout=10  # Устанавливаем таймаут для запроса
         )
         
@@ -67,34 +79,20 @@ def send_to_webhook(client_config, lead_data):
             logger.info(f"Данные лида {lead_data.get('id')} успешно отправлены в CRM клиента {client_config.get('name')}.")
             
             # Обновляем статус доставки
-            conn = get_connection()
-            if conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                UPDATE leads
-                SET crm_delivery_status = ?, crm_delivery_time = CURRENT_TIMESTAMP
-                WHERE id = ?
-                ''', ('delivered', lead_data.get('id')))
-                conn.commit()
-                conn.close()
-                
+            status_writer.enqueue(lead_data.get('id'), 'delivered', True)
+            
             return True
         else:
             error_message = f"Ошибка при отправке данных в CRM. Код ответа: {response.status_code}, ответ: {response.text}"
             logger.error(error_message)
             
+            retries = getattr(response.raw, 'retries', None)
+            if retries is not None and retries.history:
+                logger.warning(f"Лид {lead_data.get('id')}: повторных попыток отправки в CRM: {len(retries.history)}")
+            
             # Обновляем статус доставки
-            conn = get_connection()
-            if conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                UPDATE leads
-                SET crm_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-                WHERE id = ?
-                ''', (f'error: HTTP {response.status_code} - {response.text[:100]}', lead_data.get('id')))
-                conn.commit()
-                conn.close()
-                
+            status_writer.enqueue(lead_data.get('id'), f'error: HTTP {response.status_code} - {response.text[:100]}', False)
+            
             return False
     
     except requests.RequestException as e:
@@ -102,51 +100,24 @@ def send_to_webhook(client_config, lead_data):
         logger.error(error_message)
         
         # Обновляем статус доставки
-        conn = get_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            UPDATE leads
-            SET crm_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-            WHERE id = ?
-            ''', (f'error: Network - {str(e)[:100]}', lead_data.get('id')))
-            conn.commit()
-            conn.close()
-            
+        status_writer.enqueue(lead_data.get('id'), f'error: Network - {str(e)[:100]}', False)
+        
         return False
-    except json.JSONDecodeError as e:
+    except orjson.JSONEncodeError as e:
         error_message = f"Ошибка формирования JSON для вебхука: {e}"
         logger.error(error_message)
         
         # Обновляем статус доставки
-        conn = get_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            UPDATE leads
-            SET crm_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-            WHERE id = ?
-            ''', (f'error: JSON - {str(e)[:100]}', lead_data.get('id')))
-            conn.commit()
-            conn.close()
-            
+        status_writer.enqueue(lead_data.get('id'), f'error: JSON - {str(e)[:100]}', False)
+        
         return False
     except Exception as e:
         error_message = f"Неожиданная ошибка при отправке данных через вебхук: {e}"
         logger.error(error_message)
         
         # Обновляем статус доставки
-        conn = get_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            UPDATE leads
-            SET crm_delivery_status = ?, delivery_attempts = delivery_attempts + 1
-            WHERE id = ?
-            ''', (f'error: {str(e)[:100]}', lead_data.get('id')))
-            conn.commit()
-            conn.close()
-            
+        status_writer.enqueue(lead_data.get('id'), f'error: {str(e)[:100]}', False)
+        
         return False
 
 def test_webhook(webhook_url):
@@ -167,10 +138,10 @@ def test_webhook(webhook_url):
         }
         
         # Отправляем тестовый запрос
-        response = requests.post(
+        response = _session.post(
             webhook_url,
-            json=payload,
-            headers={'Content-Type': 'application/json'},
+            data=orjson.dumps(payload),
+            headers=_JSON_HEADERS,
             timeout=5  # Короткий таймаут для тестового запроса
         )
         
@@ -4,12 +4,15 @@
 Реализует HTTP-сервер для приема данных через POST-запросы напрямую от поставщиков
 и сохранения их в базу данных для последующей обработки и маршрутизации.
 """
-import json
+import gzip
+import hashlib
+import orjson
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider, JSONProvider
 from datetime import datetime
 import logging
-import re
-import os
+import shutil
+import subprocess
 import sys
 from pathlib import Path
 
@@ -18,12 +21,52 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.setup import logger, LOGS_DIR
 from src.db import init_db
-from src.processor import process_row
-from src.router import route_lead
+from src.processor import process_row_from_webhook
+from src.bitrix24 import send_to_bitrix24
 from src.raw_data_handler import save_raw_data
 
+class OrjsonProvider(JSONProvider):
+    """
+    JSON-провайдер Flask, сериализующий ответы через orjson.
+    
+    Ключи не сортируются. Даты и прочие типы, которые orjson не знает,
+    преобразуются так же, как в стандартном провайдере Flask
+    (даты - в формате HTTP-date).
+    """
+    
+    # Даты передаются в default, чтобы сохранить формат Flask вместо ISO 8601
+    _OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=self._OPTIONS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        if args and kwargs:
+            raise TypeError("app.json.response() takes either args or kwargs, not both")
+        
+        # Как в jsonify: один аргумент сериализуется как есть, несколько - списком
+        if not args and not kwargs:
+            obj = None
+        elif len(args) == 1:
+            obj = args[0]
+        else:
+            obj = args or kwargs
+        
+        # Байты от orjson передаются в ответ без промежуточного декодирования
+        return self._app.response_class(
+            orjson.dumps(obj, default=DefaultJSONProvider.default, option=self._OPTIONS),
+            mimetype='application/json'
+        )
+
+# Время кэширования страницы симулятора в браузере (секунды)
+SIMULATE_PAGE_MAX_AGE = 3600
+
 # Создаем приложение Flask
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Настраиваем логгирование Flask
 flask_log_path = Path(LOGS_DIR) / 'webhook_server.log'
@@ -35,6 +78,34 @@ flask_handler.setFormatter(logging.Formatter(
 app.logger.addHandler(flask_handler)
 app.logger.setLevel(logging.INFO)
 
+# Страница симулятора читается и сжимается один раз при запуске
+_SIMULATE_PAGE = (Path(app.static_folder) / 'simulate.html').read_bytes()
+_SIMULATE_PAGE_GZ = gzip.compress(_SIMULATE_PAGE, compresslevel=9)
+_SIMULATE_PAGE_ETAG = hashlib.sha1(_SIMULATE_PAGE).hexdigest()
+
+def _parse_json():
+    """
+    Разбирает тело запроса как JSON через orjson.
+    
+    Тело не сохраняется в объекте запроса после чтения.
+    
+    Returns:
+        Разобранные данные запроса
+    
+    Raises:
+        orjson.JSONDecodeError: Если тело запроса не является корректным JSON
+    """
+    return orjson.loads(request.get_data(cache=False))
+
+def _invalid_json_response():
+    """
+    Возвращает ответ на запрос с некорректным JSON.
+    """
+    return jsonify({
+        'success': False,
+        'message': 'Ожидается JSON'
+    }), 400
+
 @app.route('/api/external', methods=['POST'])
 def receive_external_lead():
     """
@@ -42,7 +113,10 @@ def receive_external_lead():
     """
     try:
         # Получаем данные
-        data = request.get_json()
+        try:
+            data = _parse_json()
+        except orjson.JSONDecodeError:
+            return _invalid_json_response()
         
         # Сначала сохраняем сырые данные
         success, message = save_raw_data(data)
@@ -71,21 +145,18 @@ def receive_lead():
     Принимает данные в формате JSON, обрабатывает и добавляет в БД.
     """
     try:
-        # Проверяем, что получен JSON
-        if not request.is_json:
-            return jsonify({
-                'success': False,
-                'message': 'Ожидается JSON'
-            }), 400
-        
-        # Получаем данные из запроса
-        data = request.get_json()
+        # Получаем данные из запроса, тело должно быть корректным JSON
+        try:
+            data = _parse_json()
+        except orjson.JSONDecodeError:
+            return _invalid_json_response()
         
         # Логируем полученные данные
-        app.logger.info(f"Получены данные: {json.dumps(data, ensure_ascii=False)}")
+        if app.logger.isEnabledFor(logging.INFO):
+            app.logger.info("Получены данные: %s", orjson.dumps(data).decode('utf-8'))
         
         # Обрабатываем данные
-        processed_data = process_row(data)
+        processed_data = process_row_from_webhook(data)
         
         # Проверяем результат обработки
         if processed_data is None:
@@ -95,7 +166,6 @@ def receive_lead():
             }), 400
             
         # Отправляем данные в Bitrix24
-        from src.bitrix24 import send_to_bitrix24
         if send_to_bitrix24(processed_data):
             return jsonify({
                 'success': True,
@@ -132,96 +202,60 @@ def simulation_form():
     
     Используется для тестирования API без реальных запросов от поставщика.
     """
-    html = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Симулятор отправки лидов</title>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <style>
-            body { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }
-            label { display: block; margin-top: 10px; }
-            input, textarea { width: 100%; padding: 8px; margin-top: 5px; }
-            button { margin-top: 20px; padding: 10px 15px; background-color: #4CAF50; color: white; border: none; cursor: pointer; }
-            button:hover { background-color: #45a049; }
-            pre { background-color: #f8f8f8; padding: 10px; border-radius: 5px; overflow-x: auto; }
-            .response { margin-top: 20px; }
-        </style>
-    </head>
-    <body>
-        <h1>Симулятор отправки лидов</h1>
-        <p>Используйте эту форму для тестирования приема данных от поставщика.</p>
-        
-        <form id="leadForm">
-            <label for="created_at">Дата создания (формат: YYYY-MM-DD HH:MM:SS):</label>
-            <input type="text" id="created_at" name="created_at" value="" placeholder="2025-04-03 15:37:53">
-            
-            <label for="id">ID:</label>
-            <input type="text" id="id" name="id" value="" placeholder="1316458786">
-            
-            <label for="phone">Телефон:</label>
-            <input type="text" id="phone" name="phone" value="" placeholder="79172700941">
-            
-            <label for="project_tag">Тег проекта:</label>
-            <input type="text" id="project_tag" name="project_tag" value="" placeholder="B3_[ДМД13] Диалог Чанган Казань">
-            
-            <button type="submit">Отправить</button>
-        </form>
-        
-        <div class="response">
-            <h2>Ответ сервера:</h2>
-            <pre id="response"></pre>
-        </div>
-
-        <script>
-        document.getElementById('leadForm').addEventListener('submit', async (e) => {
-            e.preventDefault();
-            
-            const formData = {
-                created_at: document.getElementById('created_at').value,
-                id: document.getElementById('id').value,
-                phone: document.getElementById('phone').value,
-                project_tag: document.getElementById('project_tag').value
-            };
-            
-            try {
-                const response = await fetch('/api/lead', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(formData),
-                });
-                
-                const result = await response.json();
-                document.getElementById('response').textContent = JSON.stringify(result, null, 2);
-            } catch (error) {
-                document.getElementById('response').textContent = 'Ошибка: ' + error.message;
-            }
-        });
-        </script>
-    </body>
-    </html>
-    """
-    return html
-
-def run_server(host='0.0.0.0', port=5000, debug=False):
+    # Сжатая версия отдается клиентам, которые поддерживают gzip
+    if 'gzip' in request.accept_encodings:
+        response = app.response_class(_SIMULATE_PAGE_GZ, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(f'{_SIMULATE_PAGE_ETAG}-gz')
+    else:
+        response = app.response_class(_SIMULATE_PAGE, mimetype='text/html')
+        response.set_etag(_SIMULATE_PAGE_ETAG)
+    
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = SIMULATE_PAGE_MAX_AGE
+    return response.make_conditional(request)
+
+def run_server(host='0.0.0.0', port=5000, debug=False, workers=1, threads=8):
     """
     Запускает веб-сервер.
     
+    Вне режима отладки приложение обслуживает gunicorn (точка входа
+    wsgi:application). Если gunicorn не установлен, используется
+    встроенный многопоточный сервер Flask.
+    
+    Ограничение частоты запросов к Битрикс24 (BITRIX24_CALLS_PER_SECOND)
+    действует внутри одного процесса, поэтому по умолчанию запускается
+    один процесс с несколькими потоками: каждый дополнительный процесс
+    добавляет к лимиту еще столько же запросов в секунду.
+    
     Args:
         host (str): Хост для прослушивания
         port (int): Порт для прослушивания
         debug (bool): Режим отладки
+        workers (int): Количество процессов gunicorn (больше 1 превышает лимит Битрикс24)
+        threads (int): Количество потоков в каждом процессе gunicorn
     """
     # Инициализируем базу данных перед запуском
     if not init_db():
         logger.error("Ошибка инициализации базы данных. Сервер не будет запущен.")
         return False
     
+    if not debug and shutil.which('gunicorn'):
+        logger.info(f"Запуск веб-сервера gunicorn на {host}:{port} ({workers} процессов по {threads} потоков)")
+        result = subprocess.run([
+            'gunicorn',
+            '-b', f'{host}:{port}',
+            '-w', str(workers),
+            '-k', 'gthread',
+            '--threads', str(threads),
+            '--keep-alive', '15',
+            'wsgi:application'
+        ], cwd=Path(__file__).parent.parent)
+        return result.returncode == 0
+    
     logger.info(f"Запуск веб-сервера на {host}:{port}")
-    app.run(host=host, port=port, debug=debug)
+    app.run(host=host, port=port, debug=debug, threaded=True)
     return True
 
 if __name__ == '__main__':
@@ -231,7 +265,10 @@ if __name__ == '__main__':
     parser.add_argument('--host', default='0.0.0.0', help='Хост для прослушивания')
     parser.add_argument('--port', type=int, default=5000, help='Порт для прослушивания')
     parser.add_argument('--debug', action='store_true', help='Режим отладки')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Количество процессов gunicorn (лимит запросов к Битрикс24 действует на каждый процесс отдельно)')
+    parser.add_argument('--threads', type=int, default=8, help='Количество потоков в процессе gunicorn')
     
     args = parser.parse_args()
     
-    run_server(host=args.host, port=args.port, debug=args.debug) 
\ No newline at end of file
+    run_server(host=args.host, port=args.port, debug=args.debug, workers=args.workers, threads=args.threads) 
\ No newline at end of file
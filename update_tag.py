@@ -5,30 +5,39 @@
 import sqlite3
 import sys
 
-# Подключение к базе данных
-conn = sqlite3.connect('database/leads.db')
+def print_clients(cursor, title):
+    """Выводит список клиентов с заголовком."""
+    print(title)
+    cursor.execute('SELECT id, name, tag FROM clients')
+    for client in cursor:
+        print(f"ID: {client[0]}, Имя: {client[1]}, Тег: {client[2]}")
+
+# С флагом --quiet списки клиентов до и после обновления не выводятся
+quiet = '--quiet' in sys.argv[1:]
+
+# Подключение к базе данных: транзакция открывается явно,
+# WAL позволяет работающему сервису читать БД во время обновления
+conn = sqlite3.connect('database/leads.db', isolation_level=None)
+conn.execute('PRAGMA journal_mode=WAL')
+conn.execute('PRAGMA synchronous=NORMAL')
 cursor = conn.cursor()
 
 # Выводим список клиентов до обновления
-print("Список клиентов до обновления:")
-cursor.execute('SELECT id, name, tag FROM clients')
-clients = cursor.fetchall()
-for client in clients:
-    print(f"ID: {client[0]}, Имя: {client[1]}, Тег: {client[2]}")
+if not quiet:
+    print_clients(cursor, "Список клиентов до обновления:")
 
-# Обновляем тег клиента с именем, содержащим "анган"
+# Обновляем тег клиента с именем, содержащим "анган", одной транзакцией
+cursor.execute('BEGIN IMMEDIATE')
 cursor.execute('UPDATE clients SET tag = ? WHERE name LIKE ?', 
                ("[ДМД13] Диалог Чанган Казань", "%анган%"))
-conn.commit()
+changed = cursor.rowcount
+cursor.execute('COMMIT')
 
 # Выводим список клиентов после обновления
-print("\nСписок клиентов после обновления:")
-cursor.execute('SELECT id, name, tag FROM clients')
-clients = cursor.fetchall()
-for client in clients:
-    print(f"ID: {client[0]}, Имя: {client[1]}, Тег: {client[2]}")
+if not quiet:
+    print_clients(cursor, "\nСписок клиентов после обновления:")
 
 # Закрываем соединение
 conn.close()
 
-print("\nТег клиента успешно обновлен.") 
\ No newline at end of file
+print(f"\nТег клиента успешно обновлен. Изменено записей: {changed}.")
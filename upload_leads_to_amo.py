@@ -7,101 +7,277 @@
 """
 
 # Импорт необходимых библиотек
-import time  # Для создания задержек между запросами
 import sys   # Для работы с путями и системными функциями
+import argparse  # Для разбора аргументов командной строки
 import os    # Для работы с файловой системой
-from typing import Dict, Any, List, Tuple  # Для типизации данных
-import pandas as pd  # Для работы с Excel файлами
-from tkinter import Tk, filedialog  # Для создания диалогового окна выбора файла
+import json  # Для записи загруженных телефонов
+import re    # Для нормализации телефонов
+from typing import Dict, Iterable, Iterator, List, Set, Tuple  # Для типизации данных
+from itertools import chain, islice  # Для чтения телефонов пакетами
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED  # Для параллельной отправки
+from openpyxl import load_workbook  # Для построчного чтения Excel файлов
+from tqdm import tqdm  # Для индикатора прогресса загрузки
 import logging
+from logging.handlers import MemoryHandler, RotatingFileHandler
 
 # Импортируем функции для работы с AmoCRM
-from create_lead import create_lead_with_phone
+from amo import api
+from create_lead import create_leads_bulk, BULK_BATCH_SIZE
 
 # Настраиваем логирование
 if not os.path.exists('logs'):
     os.makedirs('logs')
     
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/upload_leads.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger('upload_leads')
+logger.setLevel(logging.INFO)
+logger.propagate = False  # Не дублируем записи в logs/amo.log
 
-def read_leads_from_excel(file_path: str) -> List[str]:
+# Подробности по каждому телефону пишутся только в файл, в консоль выводятся
+# предупреждения и ошибки, чтобы не мешать индикатору прогресса
+file_handler = RotatingFileHandler('logs/upload_leads.log', maxBytes=10 * 1024 * 1024,
+                                   backupCount=5, encoding='utf-8', delay=True)
+file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+# Записи копятся в памяти и пишутся в файл пачкой по 1024 штуки; ошибки
+# и завершение программы сбрасывают буфер сразу
+memory_handler = MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler)
+logger.addHandler(memory_handler)
+
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.WARNING)
+console_handler.setFormatter(logging.Formatter('%(message)s'))
+logger.addHandler(console_handler)
+
+# Модули AmoCRM выводят в консоль отладочные сообщения о каждом запросе,
+# на время загрузки в консоль от них попадают только предупреждения и ошибки
+for _name in ('amo.api', 'amo.auth', 'create_lead'):
+    for _handler in logging.getLogger(_name).handlers:
+        if type(_handler) is logging.StreamHandler:
+            _handler.setLevel(logging.WARNING)
+
+# Все символы, кроме цифр, удаляются из телефона
+_DIGITS_RE = re.compile(r'\D+')
+
+# Дробная часть из нулей в конце текстового значения ('79991234567.0')
+_ZERO_FRACTION_RE = re.compile(r'\.0+$')
+
+# Количество одновременно отправляемых пакетов лидов. Частоту запросов
+# ограничивает модуль amo.api, а потоки лишь перекрывают ожидание
+# ответов сервера
+UPLOAD_WORKERS = 4
+
+# Количество пакетов на один поток, которые могут быть прочитаны из файла
+# и ожидать ответа API
+PENDING_BATCHES_PER_WORKER = 2
+
+# Файл с уже загруженными телефонами: при повторном запуске после сбоя
+# они пропускаются, чтобы не создавать дубликаты лидов в AmoCRM
+CHECKPOINT_FILE = 'logs/uploaded.jsonl'
+
+def read_leads_from_excel(file_path: str) -> Iterator[str]:
     """
-    Читает телефоны лидов из Excel-файла.
+    Построчно читает телефоны лидов из Excel-файла.
+    
+    Файл открывается в режиме только для чтения, поэтому в памяти
+    находится одна строка листа, а не весь файл. Телефоны приводятся
+    к виду из одних цифр, повторяющиеся телефоны пропускаются.
     
     Args:
         file_path (str): Путь к Excel-файлу с телефонами
         
-    Returns:
-        List[str]: Список телефонов для создания лидов
+    Yields:
+        str: Телефон для создания лида (только цифры)
     """
-    phones = []
+    count = 0  # Количество прочитанных телефонов
+    seen = set()  # Уже прочитанные телефоны
+    wb = None
+    
     try:
-        # Читаем Excel-файл в pandas DataFrame
-        df = pd.read_excel(file_path)
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        ws = wb.active
         
-        # Проверяем наличие обязательной колонки 'Телефон'
-        required_columns = ['Телефон']
-        for column in required_columns:
-            if column not in df.columns:
-                raise ValueError(f"В файле отсутствует колонка '{column}'")
+        # Ищем колонку 'Телефон' в строке заголовков
+        header = next(ws.iter_rows(max_row=1, values_only=True), ())
+        if 'Телефон' not in header:
+            raise ValueError("В файле отсутствует колонка 'Телефон'")
+        phone_column = header.index('Телефон') + 1
         
-        # Проходим по каждой строке Excel файла
-        for index, row in df.iterrows():
-            # Получаем телефон и убираем лишние пробелы
-            phone = str(row['Телефон']).strip()
+        # Значения остальных колонок не создаются
+        for (value,) in ws.iter_rows(min_row=2, min_col=phone_column, max_col=phone_column, values_only=True):
+            if value is None:
+                continue
+            
+            # Числовые ячейки приводим к целому, чтобы не получить суффикс .0.
+            # Целое число уже состоит из цифр, регулярное выражение для него не нужно
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if isinstance(value, int):
+                phone = str(value)
+            else:
+                # Отбрасываем нулевую дробную часть, иначе ее цифры попадут
+                # в номер, и оставляем только цифры:
+                # '+7 (999) 123-45-67' -> '79991234567', значения без цифр пропускаем
+                phone = _DIGITS_RE.sub('', _ZERO_FRACTION_RE.sub('', str(value).strip()))
+            if not phone:
+                continue
             
-            # Пропускаем пустые строки и строки с nan (Not a Number)
-            if phone and phone.lower() != 'nan':
-                # Убираем .0 из номера, если телефон был распознан как число
-                phone = phone.replace('.0', '')
-                
-                phones.append(phone)
-                    
-        logger.info(f"Прочитано {len(phones)} телефонов из файла")
-        return phones
+            count += 1
+            
+            if phone in seen:
+                continue
+            seen.add(phone)
+            
+            yield phone
+        
+        logger.info(f"Прочитано {count} телефонов из файла")
+        logger.info(f"Уникальных телефонов: {len(seen)} (удалено {count - len(seen)} дубликатов)")
         
     except Exception as e:
         logger.error(f"Ошибка при чтении Excel-файла: {e}")
-        return []
+    
+    finally:
+        # Закрываем файл и при досрочной остановке чтения (ошибка, отмена
+        # загрузки), а не только после последней строки
+        if wb is not None:
+            wb.close()
+
+def _collect_results(futures: Dict[Future, List[str]], done: Iterable[Future]) -> Iterator[Tuple[List[str], List[Tuple]]]:
+    """
+    Забирает результаты завершенных пакетов и убирает их из списка ожидающих.
+    
+    Args:
+        futures (Dict[Future, List[str]]): Отправляемые пакеты телефонов
+        done (Iterable[Future]): Завершенные задачи
+        
+    Yields:
+        Tuple[List[str], List[Tuple]]: Пакет телефонов и пары (ID лида, ID контакта)
+    """
+    for future in done:
+        batch = futures.pop(future)
+        try:
+            results = future.result()
+        except Exception as e:
+            logger.error(f"Ошибка при создании пакета лидов: {e}")
+            results = [(None, None)] * len(batch)
+        yield batch, results
+
+def _upload_batches(phones: Iterator[str], workers: int) -> Iterator[Tuple[List[str], List[Tuple]]]:
+    """
+    Отправляет телефоны пакетами по мере их чтения.
+    
+    Следующий пакет читается из файла, пока отправляются предыдущие, но
+    одновременно в работе не больше PENDING_BATCHES_PER_WORKER пакетов на поток,
+    чтобы чтение не опережало отправку и файл не оказался целиком в памяти.
+    
+    Args:
+        phones (Iterator[str]): Телефоны для создания лидов
+        workers (int): Количество одновременно отправляемых пакетов
+        
+    Yields:
+        Tuple[List[str], List[Tuple]]: Пакет телефонов и пары (ID лида, ID контакта)
+    """
+    max_pending = workers * PENDING_BATCHES_PER_WORKER
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        
+        while batch := list(islice(phones, BULK_BATCH_SIZE)):
+            futures[executor.submit(create_leads_bulk, batch)] = batch
+            
+            # Окно заполнено: ждем завершения хотя бы одного пакета
+            if len(futures) >= max_pending:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                yield from _collect_results(futures, done)
+        
+        # Файл прочитан, дожидаемся оставшихся пакетов
+        yield from _collect_results(futures, as_completed(futures))
+
+def load_uploaded_phones() -> Set[str]:
+    """
+    Читает телефоны, уже загруженные в AmoCRM при прошлых запусках.
+    
+    Returns:
+        Set[str]: Загруженные телефоны, пустое множество, если файла нет
+    """
+    uploaded = set()
+    if not os.path.exists(CHECKPOINT_FILE):
+        return uploaded
+    
+    try:
+        with open(CHECKPOINT_FILE, encoding='utf-8') as f:
+            for line in f:
+                # Последняя строка может быть недописана при сбое
+                try:
+                    uploaded.add(json.loads(line)['phone'])
+                except (ValueError, KeyError):
+                    continue
+        
+        logger.info(f"Ранее загружено телефонов: {len(uploaded)}")
+    
+    except Exception as e:
+        logger.error(f"Ошибка при чтении файла {CHECKPOINT_FILE}: {e}")
+    
+    return uploaded
+
+def _skip_uploaded(phones: Iterable[str], uploaded: Set[str]) -> Iterator[str]:
+    """
+    Пропускает телефоны, уже загруженные при прошлых запусках.
+    
+    Args:
+        phones (Iterable[str]): Телефоны для создания лидов
+        uploaded (Set[str]): Уже загруженные телефоны
+        
+    Yields:
+        str: Телефон, который еще не загружался
+    """
+    skipped = 0
+    for phone in phones:
+        if phone in uploaded:
+            skipped += 1
+            continue
+        yield phone
+    
+    if skipped:
+        logger.info(f"Пропущено ранее загруженных телефонов: {skipped}")
 
-def upload_leads_to_amo(phones: List[str]) -> None:
+def upload_leads_to_amo(phones: Iterable[str], workers: int = UPLOAD_WORKERS) -> None:
     """
     Загружает лиды в AmoCRM.
     
     Args:
-        phones (List[str]): Список телефонов для создания лидов
+        phones (Iterable[str]): Телефоны для создания лидов, читаются по мере отправки
+        workers (int): Количество одновременно отправляемых пакетов
     """
-    total = len(phones)  # Общее количество лидов
+    total = 0  # Общее количество лидов
     success = 0  # Счетчик успешно созданных лидов
     
-    # Проходим по каждому телефону
-    for index, phone in enumerate(phones, 1):
-        try:
-            # Отправляем лид в AmoCRM
-            lead_id, contact_id = create_lead_with_phone(phone)
+    uploaded = load_uploaded_phones()
+    
+    # Лиды создаются пакетами: один запрос к API на BULK_BATCH_SIZE телефонов.
+    # Результаты пишутся в лог по мере готовности пакетов, успешно
+    # созданные лиды сразу сохраняются в CHECKPOINT_FILE
+    with open(CHECKPOINT_FILE, 'a', encoding='utf-8') as checkpoint, \
+            tqdm(unit='lead', desc='Загрузка лидов') as progress:
+        for batch, results in _upload_batches(_skip_uploaded(phones, uploaded), workers):
+            created = []
+            for phone, (lead_id, contact_id) in zip(batch, results):
+                if lead_id:
+                    created.append(json.dumps({'phone': phone, 'lead_id': lead_id}) + '\n')
+                    logger.info(f"Успешно создан лид: {phone} (ID лида: {lead_id}, ID контакта: {contact_id})")
+                else:
+                    logger.info(f"Не удалось создать лид: {phone}")
             
-            if lead_id:
-                success += 1
-                print(f"Успешно создан лид {index}/{total}: {phone} (ID лида: {lead_id}, ID контакта: {contact_id})")
-            elif contact_id:
-                print(f"Создан только контакт {index}/{total}: {phone} (ID контакта: {contact_id})")
-            else:
-                print(f"Не удалось создать лид {index}/{total}: {phone}")
+            # Пакет записывается одной операцией
+            if created:
+                checkpoint.write(''.join(created))
+                checkpoint.flush()
             
-            # Пауза 1 секунда между запросами, чтобы не перегрузить API AmoCRM
-            time.sleep(1)
+            total += len(batch)
+            success += len(created)
+            logger.info(f"Обработан пакет из {len(batch)} лидов, успешно: {len(created)}")
             
-        except Exception as e:
-            logger.error(f"Ошибка при создании лида с телефоном {phone}: {e}")
-            print(f"Ошибка при создании лида с телефоном {phone}: {e}")
+            progress.update(len(batch))
+            progress.set_postfix(success=success, refresh=False)
     
     # Выводим итоговую статистику
     print(f"\nЗагрузка завершена. Успешно: {success}/{total}")
@@ -113,6 +289,10 @@ def select_excel_file() -> str:
     Returns:
         str: Путь к выбранному файлу или пустая строка, если файл не выбран
     """
+    # tkinter импортируется только здесь, чтобы запуск с --file
+    # работал без графического окружения
+    from tkinter import Tk, filedialog
+    
     # Создаем корневое окно Tkinter
     root = Tk()
     root.withdraw()  # Скрываем основное окно
@@ -121,26 +301,57 @@ def select_excel_file() -> str:
     # Открываем диалог выбора файла
     file_path = filedialog.askopenfilename(
         title="Выберите Excel файл с телефонами",
-        filetypes=[("Excel files", "*.xlsx *.xls")],  # Только Excel файлы
+        filetypes=[("Excel files", "*.xlsx")],  # Только Excel файлы (openpyxl не читает .xls)
         initialdir=os.path.dirname(os.path.abspath(__file__))  # Начальная директория
     )
     
     root.destroy()  # Закрываем окно Tkinter
     return file_path
 
+def parse_args() -> argparse.Namespace:
+    """
+    Разбирает аргументы командной строки.
+    
+    Returns:
+        argparse.Namespace: Аргументы запуска
+    """
+    parser = argparse.ArgumentParser(description='Загрузка лидов из Excel-файла в AmoCRM')
+    parser.add_argument('--file', help='Путь к Excel-файлу с телефонами (без него открывается диалог выбора файла)')
+    parser.add_argument('--yes', action='store_true', help='Начать загрузку без подтверждения')
+    parser.add_argument('--workers', type=int, default=UPLOAD_WORKERS,
+                        help=f'Количество одновременно отправляемых пакетов (по умолчанию {UPLOAD_WORKERS})')
+    parser.add_argument('--rps', type=float, default=api.AMO_REQUESTS_PER_SECOND,
+                        help=f'Максимум запросов к API в секунду (по умолчанию {api.AMO_REQUESTS_PER_SECOND})')
+    args = parser.parse_args()
+    
+    if args.workers < 1:
+        parser.error("--workers должно быть не меньше 1")
+    if args.rps <= 0:
+        parser.error("--rps должно быть больше 0")
+    
+    return args
+
 def main():
     """
     Основная функция для запуска загрузки лидов.
     Последовательность действий:
-    1. Выбор Excel файла через диалоговое окно
+    1. Выбор Excel файла: аргумент --file или диалоговое окно
     2. Проверка существования файла
     3. Чтение телефонов из файла
     4. Показ примера первых трех телефонов
-    5. Подтверждение загрузки
+    5. Подтверждение загрузки (пропускается с --yes)
     6. Загрузка лидов в AmoCRM
     """
-    # Открываем диалог выбора файла
-    file_path = select_excel_file()
+    args = parse_args()
+    
+    # Файл из аргументов, иначе диалог выбора файла, если есть терминал
+    if args.file:
+        file_path = args.file
+    elif sys.stdin.isatty():
+        file_path = select_excel_file()
+    else:
+        print("Не указан файл: используйте --file")
+        sys.exit(1)
     
     # Проверяем, был ли выбран файл
     if not file_path:
@@ -152,23 +363,28 @@ def main():
         print(f"Файл не найден: {file_path}")
         return
     
-    # Читаем телефоны из файла
+    api.set_requests_per_second(args.rps)
+    
+    # Читаем телефоны из файла по мере загрузки, для примера берем первые три
     phones = read_leads_from_excel(file_path)
+    preview = list(islice(phones, 3))
     
-    if phones:
-        # Показываем информацию о найденных телефонах
-        print(f"Найдено {len(phones)} телефонов.")
+    if preview:
+        # Показываем пример найденных телефонов
         print("\nПример первых 3 телефонов:")
-        for i, phone in enumerate(phones[:3]):
+        for i, phone in enumerate(preview):
             print(f"{i+1}. {phone}")
         print("-" * 50)
             
         # Запрашиваем подтверждение на загрузку
-        print("\nНачать загрузку лидов в AmoCRM? (y/n)")
-        if input().lower() == 'y':
-            upload_leads_to_amo(phones)
-        else:
-            print("Загрузка отменена")
+        if not args.yes:
+            print("\nНачать загрузку лидов в AmoCRM? (y/n)")
+            if input().lower() != 'y':
+                phones.close()  # Освобождаем Excel-файл сразу
+                print("Загрузка отменена")
+                return
+        
+        upload_leads_to_amo(chain(preview, phones), workers=args.workers)
     else:
         print("Не найдено телефонов для загрузки")
 
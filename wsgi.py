@@ -0,0 +1,17 @@
+"""
+Точка входа WSGI для веб-сервера приема лидов.
+
+Запуск:
+    gunicorn -b 0.0.0.0:5000 -w 1 -k gthread --threads 8 wsgi:application
+
+Используется один процесс: ограничение частоты запросов к Битрикс24
+(2 запроса в секунду) действует внутри процесса, и каждый дополнительный
+процесс gunicorn добавил бы к нему еще столько же запросов.
+"""
+from src.db import init_db
+from src.webhook_server import app
+
+# При запуске через gunicorn напрямую run_server не вызывается
+init_db()
+
+application = app